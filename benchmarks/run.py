@@ -0,0 +1,229 @@
+"""Benchmarks dos caminhos quentes do app com dados sintéticos, 100% offline.
+
+Uso (a partir da raiz do projeto):
+
+    python benchmarks/run.py --rows 10000 100000 --output resultados.json
+    python benchmarks/run.py --rows 10000 --compare resultados_anteriores.json
+
+Cada medição roda ``--repeat`` vezes; o JSON guarda mínimo, mediana e máximo
+em segundos, junto com o commit atual, para comparar execuções entre commits.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+SRC = os.path.join(ROOT, "src")
+sys.path[:0] = [SRC, os.path.join(SRC, "modules"), BENCH_DIR]
+
+# Uma única fonte fixa, lida antes do import do app: o resultado não depende do fontes_horas.json local
+with tempfile.NamedTemporaryFile("w", suffix=".json", prefix="bench_fontes_", delete=False) as _fontes:
+    json.dump([{"nome": "HORAS_V2", "sheet_id": "planilha-sintetica", "worksheet": "HORAS_V2"}], _fontes)
+os.environ["HORAS_FONTES"] = _fontes.name
+atexit.register(os.remove, _fontes.name)
+
+import pandas as pd  # noqa: E402
+
+import streamlit_app as app  # noqa: E402
+from modules import data_store  # noqa: E402
+from synthetic import PlanilhaLocal, cardinalidades, gerar_alocacao, gerar_horas  # noqa: E402
+
+PAINEL_AGRUPAMENTOS = {
+    "profissional": "PROFISSIONAL",
+    "cliente": "CLIENTE_CONCATENADO",
+    "periodo": "MES_ANO",
+    "area": "AREA",
+    "profissional_cliente": ["PROFISSIONAL", "CLIENTE_CONCATENADO"],
+}
+
+
+def medir(func, repeat: int, setup=None) -> dict:
+    """Executa ``func(setup())`` ``repeat`` vezes; só a chamada de ``func`` é cronometrada."""
+    tempos = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        inicio = time.perf_counter()
+        func(arg)
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        "min": min(tempos),
+        "median": statistics.median(tempos),
+        "max": max(tempos),
+        "repeat": repeat,
+    }
+
+
+class Bancos:
+    """Entrega um arquivo DuckDB novo a cada chamada, dentro de um diretório temporário."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.n = 0
+
+    def novo(self) -> str:
+        self.n += 1
+        path = os.path.join(self.base_dir, f"db{self.n:03d}", "horas.duckdb")
+        data_store.use_database(path)
+        return path
+
+
+def bench_volume(rows: int, repeat: int, bancos: Bancos) -> dict:
+    crua = gerar_horas(rows)
+    extra = gerar_horas(max(1, rows // 100), seed=7)
+    planilha = PlanilhaLocal(crua)
+    resultados = {}
+    # Data de alteração "do Drive" = versão da planilha local em uso
+    app.modified_times = lambda sheet_ids: {s: app.GSGoldenBagres.modified_time for s in sheet_ids}
+
+    def carga_inicial(_=None):
+        bancos.novo()
+        app.GSGoldenBagres = PlanilhaLocal(crua)
+        app.fetch_and_store()
+
+    resultados["tratar_horas"] = medir(
+        lambda df: app.tratar_horas(df), repeat, setup=lambda: planilha.start()
+    )
+    resultados["fetch_and_store_full"] = medir(carga_inicial, repeat)
+
+    def prepara_incremental():
+        carga_inicial()
+        app.GSGoldenBagres = PlanilhaLocal(pd.concat([crua, extra], ignore_index=True))
+
+    resultados["fetch_and_store_incremental_1pct"] = medir(
+        lambda _: app.fetch_and_store(incremental=True), repeat, setup=prepara_incremental
+    )
+
+    # Atualização agendada sem edições na planilha: nem baixa nem reescreve
+    carga_inicial()
+    resultados["fetch_and_store_sem_alteracao"] = medir(lambda _: app.fetch_and_store(), repeat)
+    # Sem data do Drive: baixa de novo, mas o hash do conteúdo evita a reescrita
+    resultados["fetch_and_store_mesmo_conteudo"] = medir(
+        lambda _: app.fetch_and_store(forcar=True), repeat
+    )
+
+    carga_inicial()
+    tratado = app.tratar_horas(planilha.start())
+    resultados["save_dataframe"] = medir(lambda _: data_store.save_dataframe(tratado), repeat)
+    resultados["load_dataframe"] = medir(
+        lambda _: data_store.load_dataframe(), repeat, setup=data_store.invalidate_cache
+    )
+
+    filtros = {col: None for col in data_store.FILTER_COLUMNS}
+    resultados["painel_kpis"] = medir(
+        lambda _: data_store.horas_kpis(filtros), repeat, setup=data_store.invalidate_cache
+    )
+    for nome, coluna in PAINEL_AGRUPAMENTOS.items():
+        resultados[f"painel_por_{nome}"] = medir(
+            lambda _, c=coluna: data_store.horas_por(c, filtros),
+            repeat,
+            setup=data_store.invalidate_cache,
+        )
+
+    def painel_completo(_):
+        data_store.horas_kpis(filtros)
+        for coluna in PAINEL_AGRUPAMENTOS.values():
+            data_store.horas_por(coluna, filtros)
+
+    painel_completo(None)
+    resultados["painel_completo_cache_quente"] = medir(painel_completo, repeat)
+
+    # Montagem dos specs Vega-Lite (dados já em cache), limitados por top-N
+    def graficos_painel(_):
+        por_cliente = data_store.horas_por("CLIENTE_CONCATENADO", filtros)
+        app.bar_chart_with_labels(por_cliente, "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS", horizontal=True).to_dict()
+        por_par = data_store.horas_por(["PROFISSIONAL", "CLIENTE_CONCATENADO"], filtros)
+        app.stacked_bar_chart(por_par, "PROFISSIONAL", "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS").to_dict()
+
+    resultados["graficos_painel"] = medir(graficos_painel, repeat)
+
+    # Painel inteiro memoizado por combinação de filtros: primeira visita e revisita
+    resultados["dados_painel_primeira"] = medir(
+        lambda _: app.dados_painel(filtros), repeat, setup=app.get_painel_cache().clear
+    )
+    resultados["dados_painel_revisita"] = medir(lambda _: app.dados_painel(filtros), repeat)
+
+    # Upload do CSV de alocação, lido pelo DuckDB a partir do disco
+    alocacao = gerar_alocacao(tratado)
+    csv_path = os.path.join(bancos.base_dir, "alocacao.csv")
+    alocacao.to_csv(csv_path, sep=";", index=False)
+    resultados["save_alocacao_csv"] = medir(lambda _: data_store.save_alocacao_csv(csv_path), repeat)
+
+    # Relatório inclui o merge de alocação vs realizado
+    data_store.save_alocacao(alocacao)
+    resultados["gerar_relatorio_html"] = medir(
+        lambda _: app.gerar_relatorio_html(filtros), repeat, setup=data_store.invalidate_cache
+    )
+    return resultados
+
+
+def commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual: dict, anterior: dict) -> None:
+    """Imprime a razão mediana atual/anterior para cada medição presente nos dois."""
+    for rows, medicoes in atual["volumes"].items():
+        antes = anterior.get("volumes", {}).get(rows, {})
+        for nome, r in medicoes["resultados"].items():
+            if nome in antes.get("resultados", {}):
+                base = antes["resultados"][nome]["median"]
+                razao = r["median"] / base if base else float("inf")
+                marca = "  <-- regressão" if razao > 1.2 else ""
+                print(f"{rows:>10} {nome:<38} {base:9.4f}s -> {r['median']:9.4f}s  x{razao:5.2f}{marca}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="volumes de linhas de horas")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "volumes": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_horas_") as tmp:
+        bancos = Bancos(tmp)
+        for rows in args.rows:
+            print(f"Volume {rows} linhas...", file=sys.stderr)
+            resultado["volumes"][str(rows)] = {
+                "cardinalidades": cardinalidades(rows),
+                "resultados": bench_volume(rows, args.repeat, bancos),
+            }
+        data_store.use_database(os.path.join(tmp, "vazio.duckdb"))
+        data_store._manager.close()
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Gerador de dados sintéticos de horas/alocação e um cliente de planilha local.
+
+Os valores imitam o que vem da aba HORAS_V2: tudo texto, horas com vírgula
+decimal e algumas linhas sem período válido.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+AREAS = ["DADOS", "MKT_CLOUD", "CRM", "BI", "ENGENHARIA", "PRODUTO", "SUPORTE", "GESTAO"]
+
+
+def cardinalidades(rows: int) -> dict:
+    """Cardinalidades realistas para o volume pedido (centenas de pessoas/clientes no topo)."""
+    return {
+        "profissionais": int(min(500, max(10, rows // 20_000))),
+        "clientes": int(min(300, max(8, rows // 30_000))),
+        "meses": int(min(120, max(12, rows // 100_000))),
+    }
+
+
+def gerar_horas(rows: int, seed: int = 42, invalid_ratio: float = 0.01) -> pd.DataFrame:
+    """Planilha de horas crua (strings), com ``invalid_ratio`` de linhas sem MES/ANO."""
+    rng = np.random.default_rng(seed)
+    card = cardinalidades(rows)
+    profissionais = np.array([f"Profissional {i:03d}" for i in range(card["profissionais"])])
+    clientes = np.array([f"CLIENTE_{i:03d}" for i in range(card["clientes"])])
+
+    periodo = rng.integers(0, card["meses"], rows)
+    ano = 2020 + periodo // 12
+    mes = periodo % 12 + 1
+    dia = rng.integers(1, 29, rows)
+    inicio = rng.integers(8 * 60, 17 * 60, rows)
+    minutos = rng.integers(5, 240, rows)
+    fim = inicio + minutos
+    horas = np.round(minutos / 60, 1)
+
+    mes_str = mes.astype(str).astype(object)
+    ano_str = ano.astype(str).astype(object)
+    invalid = rng.random(rows) < invalid_ratio
+    mes_str[invalid] = ""
+    ano_str[invalid] = ""
+
+    cliente = clientes[rng.integers(0, len(clientes), rows)]
+    return pd.DataFrame({
+        "PROFISSIONAL": profissionais[rng.integers(0, len(profissionais), rows)],
+        "CLIENTE": cliente,
+        "DIA": pd.Series(dia).astype(str).str.zfill(2) + "/" + pd.Series(mes).astype(str).str.zfill(2) + "/" + pd.Series(ano).astype(str),
+        "INICIO": pd.Series(inicio // 60).astype(str) + ":" + pd.Series(inicio % 60).astype(str),
+        "PAUSA": "",
+        "VOLTA": "",
+        "FIM": pd.Series(fim // 60).astype(str) + ":" + pd.Series(fim % 60).astype(str).str.zfill(2),
+        "CARD": "REUNIÃO",
+        "TOTAL": pd.Series(minutos // 60).astype(str) + ":" + pd.Series(minutos % 60).astype(str).str.zfill(2),
+        "MINUTO": minutos.astype(str),
+        "AREA": np.array(AREAS)[rng.integers(0, len(AREAS), rows)],
+        "MES": mes_str,
+        "ANO": ano_str,
+        "VALIDADOR": "FALSE",
+        "CLIENTE_CONCATENADO": cliente,
+        "HORAS_EM_MINUTOS": pd.Series(horas).astype(str).str.replace(".", ",", regex=False),
+    })
+
+
+def gerar_alocacao(horas: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
+    """Alocação para cada par profissional/cliente presente nas horas."""
+    rng = np.random.default_rng(seed)
+    pares = horas[["PROFISSIONAL", "CLIENTE_CONCATENADO"]].drop_duplicates()
+    n = len(pares)
+    return pd.DataFrame({
+        "CONCAT": (pares["PROFISSIONAL"] + pares["CLIENTE_CONCATENADO"]).to_numpy(),
+        "PROFISSIONAL": pares["PROFISSIONAL"].to_numpy(),
+        "AREA": np.array(AREAS)[rng.integers(0, len(AREAS), n)],
+        "CLIENTE": pares["CLIENTE_CONCATENADO"].to_numpy(),
+        "MES_ANTERIOR": rng.integers(0, 101, n),
+        "MES_ATUAL": rng.integers(0, 101, n),
+        "PROXIMO_MES": rng.integers(0, 101, n),
+        "HORAS_TOTAIS": rng.integers(40, 400, n).astype(float),
+        "HORAS_MES": rng.choice([80, 120, 160], n),
+    })
+
+
+class PlanilhaLocal:
+    """Substituto offline do GSGoldenBagres, servindo um DataFrame em memória.
+
+    ``modified_time`` faz o papel do ``modifiedTime`` do Drive: muda a cada
+    nova instância, isto é, a cada nova versão da planilha.
+    """
+
+    _versoes = itertools.count(1)
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.modified_time = f"versao-{next(self._versoes)}"
+
+    def __call__(self, **kwargs):
+        # Permite usar a instância no lugar da classe: GSGoldenBagres(sheet_id=..., ...)
+        return self
+
+    def start(self, start_row: int = 2) -> pd.DataFrame:
+        df = self.df.iloc[start_row - 2:].copy()
+        df["LINHA"] = range(start_row, start_row + len(df))
+        return df
+
+    def iter_chunks(self, start_row: int = 2, chunk_size: int = 5000):
+        for first in range(max(start_row, 2), len(self.df) + 2, chunk_size):
+            chunk = self.df.iloc[first - 2:first - 2 + chunk_size].copy()
+            chunk["LINHA"] = range(first, first + len(chunk))
+            yield chunk
@@ -0,0 +1,122 @@
+"""Gera em lote os relatórios HTML por profissional, cliente e período, sem o Streamlit.
+
+Uso (a partir da raiz do projeto):
+
+    python src/gerar_relatorios.py --saida relatorios/
+    python src/gerar_relatorios.py --saida relatorios/ --por profissional --workers 4
+
+As tabelas agregadas (rollup, períodos e alocação) são lidas do DuckDB uma
+única vez e repassadas aos processos do pool, que montam cada relatório num
+banco em memória com as mesmas consultas do app. Ao final é gravado um
+``manifest.json`` com os arquivos gerados.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "modules"))
+
+from modules import data_store, relatorio  # noqa: E402
+
+# Tipo de relatório -> coluna filtrada
+DIMENSOES = {
+    "profissional": "PROFISSIONAL",
+    "cliente": "CLIENTE_CONCATENADO",
+    "periodo": "MES_ANO",
+}
+MANIFEST = "manifest.json"
+
+# Conexão em memória de cada processo do pool, criada no initializer
+_con = None
+
+
+def _slug(valor: str) -> str:
+    texto = unicodedata.normalize("NFKD", str(valor)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_") or "vazio"
+
+
+def _iniciar_worker(base: dict) -> None:
+    global _con
+    _con = data_store.report_connection(base)
+
+
+def _gerar(job: tuple[str, str | None, str]) -> dict:
+    """Renderiza e grava um relatório; devolve a entrada do manifesto."""
+    tipo, valor, arquivo = job
+    inicio = time.perf_counter()
+    filters = {DIMENSOES[tipo]: [valor]} if valor is not None else None
+    # Em lote, cada relatório mostra só as alocações do próprio filtro
+    dados = data_store.dados_relatorio(_con, filters, todas_alocacoes=False)
+    os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+    with open(arquivo, "w", encoding="utf-8") as f:
+        for parte in relatorio.render(**dados):
+            f.write(parte)
+    return {
+        "tipo": tipo,
+        "valor": valor,
+        "arquivo": arquivo,
+        "registros": dados["kpis"]["registros"],
+        "horas": round(dados["kpis"]["horas"], 1),
+        "bytes": os.path.getsize(arquivo),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+
+def montar_jobs(saida: str, tipos: list[str], options: dict[str, list[str]]) -> list[tuple]:
+    jobs = [("geral", None, os.path.join(saida, "geral.html"))]
+    for tipo in tipos:
+        usados = set()
+        for valor in options[DIMENSOES[tipo]]:
+            # "Mars" e "MARS" colidiriam em sistemas de arquivos sem distinção de caixa
+            nome = base = _slug(valor)
+            n = 1
+            while nome.lower() in usados:
+                n += 1
+                nome = f"{base}_{n}"
+            usados.add(nome.lower())
+            jobs.append((tipo, valor, os.path.join(saida, tipo, f"{nome}.html")))
+    return jobs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--saida", default="relatorios", help="diretório de saída")
+    parser.add_argument("--por", nargs="+", choices=list(DIMENSOES), default=list(DIMENSOES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processos do pool")
+    parser.add_argument("--db", help="arquivo DuckDB (padrão: o do app)")
+    args = parser.parse_args()
+
+    if args.db:
+        data_store.use_database(args.db)
+    if not data_store.table_exists():
+        sys.exit("Nenhum dado de horas no banco; rode a atualização de dados primeiro.")
+
+    inicio = time.perf_counter()
+    base = data_store.report_base()
+    jobs = montar_jobs(args.saida, args.por, data_store.filter_options())
+    # O initializer recebe a base uma vez por processo, não uma vez por relatório
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_iniciar_worker, initargs=(base,)) as pool:
+        chunksize = max(1, len(jobs) // (4 * (args.workers or 1)))
+        relatorios = list(pool.map(_gerar, jobs, chunksize=chunksize))
+
+    manifest = {
+        "gerado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "ultima_atualizacao": data_store.get_last_update(),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "relatorios": [
+            {**r, "arquivo": os.path.relpath(r["arquivo"], args.saida)} for r in relatorios
+        ],
+    }
+    with open(os.path.join(args.saida, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    print(f"{len(relatorios)} relatórios gerados em {args.saida} ({manifest['segundos']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Pasta do Drive com os CSVs de alocação, um por período (ex.: alocacao_2026-03.csv)
+PASTA_ID = os.environ.get("HORAS_ALOCACAO_PASTA")
+# AAAA-MM, AAAAMM, MM-AAAA ou MMAAAA no nome do arquivo (separador -, _ ou .)
+_PERIODO_NOME = re.compile(
+    r"(?<!\d)(?:(?P<ano>20\d{2})[-_.]?(?P<mes>0[1-9]|1[0-2])|(?P<mes2>0[1-9]|1[0-2])[-_.]?(?P<ano2>20\d{2}))(?!\d)"
+)
+
+
+def periodo_do_nome(nome: str) -> int | None:
+    """Período AAAAMM indicado no nome do arquivo, ou ``None``."""
+    m = _PERIODO_NOME.search(nome)
+    if m is None:
+        return None
+    ano, mes = (m["ano"], m["mes"]) if m["ano"] else (m["ano2"], m["mes2"])
+    return int(ano) * 100 + int(mes)
+
+
+def _md5(path: str, bloco: int = 1024 * 1024) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while parte := f.read(bloco):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def _eh_csv(arquivo: dict) -> bool:
+    return arquivo.get("mimeType") == "text/csv" or arquivo["name"].lower().endswith(".csv")
+
+
+def planejar(arquivos: list[dict], versoes: dict[int, dict]) -> tuple[dict[int, dict], list[dict]]:
+    """Escolhe o CSV a carregar em cada período; devolve ``(por período, ignorados)``.
+
+    Por período vale o arquivo alterado por último na pasta. Ele é ignorado
+    se o ``md5Checksum`` do Drive for o da versão já carregada (o mesmo
+    conteúdo, mesmo que reenviado com outro nome).
+    """
+    escolhidos: dict[int, dict] = {}
+    ignorados = []
+    for arquivo in arquivos:
+        periodo = periodo_do_nome(arquivo["name"]) if _eh_csv(arquivo) else None
+        if periodo is None:
+            ignorados.append({**arquivo, "motivo": "não é CSV com período (AAAA-MM) no nome"})
+            continue
+        atual = escolhidos.get(periodo)
+        if atual is None or arquivo["modifiedTime"] > atual["modifiedTime"]:
+            if atual is not None:
+                ignorados.append({**atual, "motivo": "há versão mais nova do período na pasta"})
+            escolhidos[periodo] = arquivo
+        else:
+            ignorados.append({**arquivo, "motivo": "há versão mais nova do período na pasta"})
+    for periodo, arquivo in list(escolhidos.items()):
+        carregado = versoes.get(periodo)
+        if carregado and arquivo.get("md5Checksum") and arquivo["md5Checksum"] == carregado["MD5"]:
+            ignorados.append({**arquivo, "motivo": "conteúdo já carregado"})
+            del escolhidos[periodo]
+    return escolhidos, ignorados
+
+
+def sincronizar_pasta(
+    pasta_id: str,
+    abrir_drive: Callable[[], object],
+    store,
+    max_workers: int = 4,
+    progress=None,
+) -> dict:
+    """Carrega em ``alocacao`` os CSVs novos ou alterados da pasta do Drive.
+
+    A listagem é paginada; os CSVs escolhidos (ver ``planejar``) são baixados
+    em paralelo, cada thread com o próprio cliente ``abrir_drive()``, e
+    gravados num diretório temporário sem passar inteiros pela memória. O md5
+    do arquivo baixado é conferido de novo contra a versão carregada antes de
+    o DuckDB ler os CSVs, numa única transação via
+    ``store.save_alocacao_periodos``. ``store`` é o módulo data_store.
+    Devolve o resumo com os períodos carregados e os arquivos ignorados.
+    """
+    progress = progress or (lambda fraction, message="": None)
+    progress(0.05, "Listando a pasta de alocações no Drive...")
+    arquivos = list(abrir_drive().iter_folder(pasta_id))
+    versoes = store.alocacao_versoes()
+    escolhidos, ignorados = planejar(arquivos, versoes)
+    if not escolhidos:
+        return {"carregados": [], "ignorados": ignorados}
+
+    local = threading.local()
+    baixados = 0
+
+    def baixar(item: tuple[int, dict]) -> tuple[int, dict, str, str]:
+        periodo, arquivo = item
+        if not hasattr(local, "drive"):
+            local.drive = abrir_drive()
+        path = os.path.join(destino_dir, f"{arquivo['id']}.csv")
+        local.drive.download_to(arquivo["id"], path)
+        md5 = _md5(path)
+        if arquivo.get("md5Checksum") and md5 != arquivo["md5Checksum"]:
+            raise RuntimeError(f"Download corrompido de {arquivo['name']} (md5 diferente do Drive)")
+        return periodo, arquivo, path, md5
+
+    paths, historico = {}, []
+    with tempfile.TemporaryDirectory(prefix="alocacao-") as destino_dir:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alocacao") as pool:
+            for periodo, arquivo, path, md5 in pool.map(baixar, sorted(escolhidos.items())):
+                baixados += 1
+                progress(0.1 + 0.7 * baixados / len(escolhidos), f"{baixados}/{len(escolhidos)} arquivos baixados...")
+                if versoes.get(periodo, {}).get("MD5") == md5:
+                    ignorados.append({**arquivo, "motivo": "conteúdo já carregado"})
+                    continue
+                paths[periodo] = path
+                historico.append({
+                    "ID": arquivo["id"],
+                    "NOME": arquivo["name"],
+                    "PERIODO": periodo,
+                    "MD5": md5,
+                    "MODIFIED_TIME": arquivo["modifiedTime"],
+                })
+        if paths:
+            progress(0.85, f"Gravando {len(paths)} período(s) de alocação...")
+            linhas = store.save_alocacao_periodos(paths, historico)
+            historico = [{**h, "LINHAS": linhas.get(h["PERIODO"], 0)} for h in historico]
+    logger.info("Alocação: %d período(s) carregado(s), %d arquivo(s) ignorado(s)", len(paths), len(ignorados))
+    return {"carregados": historico, "ignorados": ignorados}
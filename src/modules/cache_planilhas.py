@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import uuid
+from collections.abc import Iterator
+from datetime import datetime
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+META = "meta.json"
+
+
+def _fonte_dir(base_dir: str, nome: str) -> str:
+    return os.path.join(base_dir, quote(nome, safe=""))
+
+
+def _partes(path: str) -> list[str]:
+    try:
+        nomes = sorted(n for n in os.listdir(path) if n.endswith(".parquet"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(path, n) for n in nomes]
+
+
+def ler_meta(base_dir: str, nome: str) -> dict | None:
+    """Estado da última importação confirmada da fonte (``None`` se não houver cache)."""
+    try:
+        with open(os.path.join(_fonte_dir(base_dir, nome), META), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _ler(partes: list[str], colunas: list[str]) -> Iterator[pd.DataFrame]:
+    for parte in partes:
+        yield pd.read_parquet(parte).set_axis(colunas, axis=1)
+
+
+def iter_cache(base_dir: str, nome: str) -> Iterator[pd.DataFrame]:
+    """Pedaços brutos da fonte guardados em disco, na ordem em que foram baixados."""
+    meta = ler_meta(base_dir, nome)
+    if meta is not None:
+        # Partes além das do meta são de uma gravação que não chegou a ser confirmada
+        yield from _ler(_partes(_fonte_dir(base_dir, nome))[: meta["partes"]], meta["colunas"])
+
+
+def content_hash(meta: dict) -> str:
+    return f"{len(meta['colunas'])}:{meta['linhas']}:{meta['soma']:016x}"
+
+
+class Gravacao:
+    """Pedaços brutos de uma fonte sendo baixados para um diretório temporário.
+
+    O meta guarda o ``modifiedTime`` do Drive visto antes do download, o hash
+    do conteúdo e a última linha (``row_key``) lida.
+
+    O hash do conteúdo é a soma (módulo 2**64) dos hashes das linhas, então
+    não depende de como a planilha foi fatiada e pode ser continuado por uma
+    leitura incremental (``continuar=True``). Nada substitui o cache até
+    ``confirmar``, chamado só depois que a carga no banco deu certo.
+    """
+
+    def __init__(self, base_dir: str, nome: str, continuar: bool = False, row_key: str = "LINHA"):
+        self.base_dir = base_dir
+        self.nome = nome
+        self.row_key = row_key
+        self.anterior = ler_meta(base_dir, nome) if continuar else None
+        self.dir = os.path.join(base_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.dir)
+        self.colunas: list[str] = self.anterior["colunas"] if self.anterior else []
+        self.linhas = self.anterior["linhas"] if self.anterior else 0
+        self.soma = np.uint64(self.anterior["soma"] if self.anterior else 0)
+        self.ultima_linha = self.anterior["ultima_linha"] if self.anterior else None
+        self._primeira = self.anterior["partes"] if self.anterior else 0
+        self.partes = 0
+
+    def gravar(self, chunk: pd.DataFrame) -> None:
+        if not self.colunas:
+            self.colunas = list(chunk.columns)
+        with np.errstate(over="ignore"):
+            self.soma += pd.util.hash_pandas_object(chunk, index=False).to_numpy().sum(dtype=np.uint64)
+        self.linhas += len(chunk)
+        if len(chunk) and self.row_key in chunk.columns:
+            self.ultima_linha = max(self.ultima_linha or 0, int(chunk[self.row_key].max()))
+        # Cabeçalhos da planilha podem vir vazios ou repetidos; o Parquet guarda só a posição
+        chunk.set_axis([str(i) for i in range(chunk.shape[1])], axis=1).to_parquet(
+            os.path.join(self.dir, f"parte-{self._primeira + self.partes:06d}.parquet"), index=False
+        )
+        self.partes += 1
+
+    def meta(self, modified_time: str | None) -> dict:
+        return {
+            "modified_time": modified_time,
+            "colunas": self.colunas,
+            "linhas": self.linhas,
+            "soma": int(self.soma),
+            "ultima_linha": self.ultima_linha,
+            "partes": self._primeira + self.partes,
+            "atualizado_em": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def iter_chunks(self) -> Iterator[pd.DataFrame]:
+        """Os pedaços baixados nesta gravação (sem os anteriores, se continuada)."""
+        yield from _ler(_partes(self.dir), self.colunas)
+
+    def confirmar(self, modified_time: str | None) -> None:
+        destino = _fonte_dir(self.base_dir, self.nome)
+        if self.anterior is not None and os.path.isdir(destino):
+            for parte in _partes(self.dir):
+                os.replace(parte, os.path.join(destino, os.path.basename(parte)))
+            shutil.rmtree(self.dir, ignore_errors=True)
+        else:
+            shutil.rmtree(destino, ignore_errors=True)
+            os.replace(self.dir, destino)
+        # Meta por último: se o processo cair antes, a próxima leitura baixa de novo
+        tmp = os.path.join(destino, META + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta(modified_time), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(destino, META))
+
+    def descartar(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -1,94 +1,1000 @@
+import atexit
+import functools
+import logging
 import os
+import threading
+from collections.abc import Collection, Iterable
+from contextlib import contextmanager
 from datetime import datetime
 
 import duckdb
 import pandas as pd
+import pyarrow as pa
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data_horas", "horas.duckdb")
+import perf
+import snapshots
+from result_cache import ResultCache, freeze
+from write_queue import WriteQueue
 
+logger = logging.getLogger(__name__)
 
-def get_connection() -> duckdb.DuckDBPyConnection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    return duckdb.connect(DB_PATH)
+# HORAS_DB_PATH permite apontar para outro banco (benchmarks, CLI, testes manuais)
+DB_PATH = os.environ.get(
+    "HORAS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "data_horas", "horas.duckdb"),
+)
 
+# Colunas aceitas como filtro/agrupamento nas consultas do painel
+FILTER_COLUMNS = ("PROFISSIONAL", "CLIENTE_CONCATENADO", "MES_ANO")
+GROUP_COLUMNS = ("PROFISSIONAL", "CLIENTE_CONCATENADO", "MES_ANO", "AREA")
 
-def table_exists() -> bool:
-    con = get_connection()
+# Chave estável de cada registro: planilha de origem + número da linha nela, e hash do conteúdo
+ORIGIN_COLUMN = "ORIGEM"
+ROW_KEY = "LINHA"
+ROW_KEYS = (ORIGIN_COLUMN, ROW_KEY)
+ROW_HASH = "HASH_LINHA"
+# Origem atribuída às linhas gravadas antes da ingestão de várias planilhas
+LEGACY_ORIGIN = "HORAS_V2"
+# Última linha lida de cada planilha (mesmo as descartadas no tratamento), gravada junto com o MERGE
+SYNC_TABLE = "sync_estado"
+
+# Tabelas de dimensão (valores distintos) mantidas a cada gravação de horas
+DIMENSIONS = {
+    "PROFISSIONAL": "dim_profissional",
+    "CLIENTE_CONCATENADO": "dim_cliente",
+    "AREA": "dim_area",
+}
+
+# Grão da tabela pré-agregada rollup_horas (MES_ANO acompanha o PERIODO)
+ROLLUP_KEYS = ("PROFISSIONAL", "CLIENTE_CONCATENADO", "AREA", "PERIODO")
+
+# Colunas de horas -> colunas equivalentes na tabela alocacao
+ALOCACAO_KEYS = {"PROFISSIONAL": "PROFISSIONAL", "CLIENTE_CONCATENADO": "CLIENTE"}
+
+# Contrato do CSV de alocação: colunas exigidas e as convertidas em número (vazio ou inválido vira 0)
+ALOCACAO_COLUNAS = ("PROFISSIONAL", "CLIENTE", "MES_ATUAL", "HORAS_MES")
+ALOCACAO_NUMERICAS = ("MES_ANTERIOR", "MES_ATUAL", "PROXIMO_MES", "HORAS_TOTAIS", "HORAS_MES")
+# Chaves lidas sempre como texto (códigos numéricos não viram BIGINT e a junção com horas segue válida)
+ALOCACAO_TEXTO = ("PROFISSIONAL", "CLIENTE", "AREA", "CONCAT")
+# Linhas lidas para detectar separador, cabeçalho e tipos
+CSV_SAMPLE_SIZE = 20_480
+
+# Escritas aguardando a thread de escrita; com a fila cheia, quem grava espera vaga
+WRITE_QUEUE_SIZE = 8
+
+# Filtro de linhas válidas do esquema antigo, em que MES_ANO era texto livre
+_LEGACY_VALID_ROWS = r"regexp_matches(MES_ANO, '^\d{2}/\d{4}$')"
+
+
+class ConnectionManager:
+    """Mantém uma conexão DuckDB por processo e entrega um cursor por thread.
+
+    O Streamlit executa cada sessão em sua própria thread; cada uma recebe um
+    cursor (``con.cursor()``) da conexão compartilhada, evitando reabrir o
+    arquivo e recarregar o catálogo a cada chamada.
+    """
+
+    def __init__(self, path: str, setup=None, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self._setup = setup
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def connection(self) -> duckdb.DuckDBPyConnection:
+        if self._con is None:
+            with self._lock:
+                if self._con is None:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with perf.span("duckdb.connect", path=self.path):
+                        con = duckdb.connect(self.path, read_only=self.read_only)
+                        # Migração grava no banco; em modo leitura o esquema é usado como está
+                        if self._setup is not None and not self.read_only:
+                            self._setup(con)
+                    self._con = con
+        return self._con
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        con = self.connection()
+        cur = getattr(self._local, "cursor", None)
+        if cur is None or getattr(self._local, "owner", None) is not con:
+            cur = perf.TracedCursor(con.cursor())
+            self._local.cursor = cur
+            self._local.owner = con
+        return cur
+
+    @contextmanager
+    def session(self):
+        yield self.cursor()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+        self._local = threading.local()
+
+
+_manager = ConnectionManager(DB_PATH, setup=lambda con: _migrate_schema(con))
+atexit.register(_manager.close)
+
+
+def use_database(path: str, read_only: bool = False) -> None:
+    """Aponta o processo para outro arquivo DuckDB (benchmarks, CLI, API).
+
+    Com ``read_only`` a conexão não bloqueia o arquivo para escrita, e vários
+    processos leitores podem abri-lo ao mesmo tempo.
+    """
+    _manager.close()
+    _manager.path = path
+    _manager.read_only = read_only
+    invalidate_cache()
+
+
+def get_connection():
+    """Context manager que entrega o cursor DuckDB da thread atual."""
+    return _manager.session()
+
+
+# Cache de cargas/agregações, chaveado pela versão dos dados
+_cache = ResultCache()
+_generation = 0
+
+
+def _read_version(con: duckdb.DuckDBPyConnection, table_name: str) -> str | None:
+    try:
+        return con.execute(f"SELECT max(updated_at) FROM {table_name}").fetchone()[0]
+    except duckdb.CatalogException:
+        return None
+
+
+def get_data_version() -> tuple:
+    """Versão atual dos dados: horário da última carga de horas e de alocação."""
+    with get_connection() as con:
+        return (_generation, _read_version(con, "metadata"), _read_version(con, "metadata_alocacao"))
+
+
+def invalidate_cache() -> None:
+    global _generation
+    _generation += 1
+    _cache.clear()
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+def _cached(func):
+    """Memoiza o resultado de ``func`` até a próxima mudança de versão dos dados."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with perf.span(f"data_store.{func.__name__}") as s:
+            key = (func.__name__, freeze(args), freeze(kwargs), get_data_version())
+            hits = _cache.hits
+            result = _cache.get_or_compute(key, lambda: func(*args, **kwargs))
+            s.attrs["cache"] = "hit" if _cache.hits > hits else "miss"
+            return result
+    return wrapper
+
+
+# Toda escrita passa por uma única thread; leituras seguem nos cursores de cada sessão
+_writer = WriteQueue(maxsize=WRITE_QUEUE_SIZE)
+
+
+def write_stats() -> dict:
+    """Escritas feitas, pendentes e tempos de espera na fila de escrita."""
+    return _writer.stats()
+
+
+def _serialized(func):
+    """Executa ``func`` na thread de escrita, uma escrita por vez."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return _writer.run(func.__name__, lambda: func(*args, **kwargs))
+    return wrapper
+
+
+@contextmanager
+def _transaction(con: duckdb.DuckDBPyConnection):
+    """Leitores em outras sessões só enxergam as alterações após o commit."""
+    con.begin()
+    try:
+        yield con
+    except Exception:
+        con.rollback()
+        raise
+    con.commit()
+
+
+def _arrow_df(result: duckdb.DuckDBPyConnection) -> pd.DataFrame:
+    """Resultado como DataFrame sobre buffers Arrow (``pd.ArrowDtype``).
+
+    Evita converter cada string em objeto Python como o ``.df()`` faz; o
+    ``st.dataframe`` serializa essas colunas sem nova cópia.
+    """
+    return result.fetch_arrow_table().to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table_name: str) -> bool:
     result = con.execute(
-        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'horas'"
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = ?",
+        [table_name],
     ).fetchone()
-    con.close()
     return result[0] > 0
 
 
+def _columns(con: duckdb.DuckDBPyConnection, table_name: str) -> list[str]:
+    if not _table_exists(con, table_name):
+        return []
+    return [c[0] for c in con.execute(f'DESCRIBE "{table_name}"').fetchall()]
+
+
+def _refresh_dimensions(con: duckdb.DuckDBPyConnection) -> None:
+    # Lidas do rollup, que tem ordens de grandeza menos linhas que horas
+    for col, table_name in DIMENSIONS.items():
+        con.execute(
+            f'CREATE OR REPLACE TABLE {table_name} AS SELECT DISTINCT "{col}" FROM rollup_horas '
+            f'WHERE "{col}" IS NOT NULL ORDER BY "{col}"'
+        )
+    con.execute(
+        "CREATE OR REPLACE TABLE dim_periodo AS "
+        "SELECT DISTINCT PERIODO, MES_ANO FROM rollup_horas ORDER BY PERIODO"
+    )
+
+
+def _rollup_select(where: str = "TRUE") -> str:
+    return (
+        "SELECT PROFISSIONAL, CLIENTE_CONCATENADO, AREA, PERIODO, any_value(MES_ANO) AS MES_ANO, "
+        "sum(HORAS_EM_MINUTOS) AS HORAS_EM_MINUTOS, count(*) AS REGISTROS "
+        f"FROM horas WHERE {where} GROUP BY PROFISSIONAL, CLIENTE_CONCATENADO, AREA, PERIODO"
+    )
+
+
+def _rebuild_rollups(con: duckdb.DuckDBPyConnection) -> None:
+    con.execute(f"CREATE OR REPLACE TABLE rollup_horas AS {_rollup_select()}")
+    _refresh_dimensions(con)
+
+
+def _refresh_rollups(con: duckdb.DuckDBPyConnection, groups_table: str) -> None:
+    """Recalcula só os grupos do rollup listados em ``groups_table``."""
+    def match(alias: str) -> str:
+        return " AND ".join(
+            f"g.{k} IS NOT DISTINCT FROM {alias}.{k}" for k in ROLLUP_KEYS
+        )
+
+    con.execute(
+        f"DELETE FROM rollup_horas "
+        f"WHERE EXISTS (SELECT 1 FROM {groups_table} g WHERE {match('rollup_horas')})"
+    )
+    touched = f"EXISTS (SELECT 1 FROM {groups_table} g WHERE {match('horas')})"
+    con.execute(f"INSERT INTO rollup_horas {_rollup_select(touched)}")
+    _refresh_dimensions(con)
+
+
+def _migrate_schema(con: duckdb.DuckDBPyConnection) -> None:
+    """Atualiza a tabela horas de esquemas antigos (períodos em texto, sem origem)."""
+    columns = _columns(con, "horas")
+    if not columns:
+        return
+    if "PERIODO" not in columns:
+        con.execute(f"""
+            CREATE OR REPLACE TABLE horas AS
+            SELECT * REPLACE (CAST(MES AS SMALLINT) AS MES, CAST(ANO AS SMALLINT) AS ANO),
+                   CAST(ANO AS INTEGER) * 100 + CAST(MES AS INTEGER) AS PERIODO
+            FROM horas
+            WHERE {_LEGACY_VALID_ROWS}
+        """)
+        _rebuild_rollups(con)
+    elif not _table_exists(con, "rollup_horas"):
+        _rebuild_rollups(con)
+    if ROW_KEY in columns and ORIGIN_COLUMN not in columns:
+        con.execute(f"ALTER TABLE horas ADD COLUMN {ORIGIN_COLUMN} VARCHAR DEFAULT '{LEGACY_ORIGIN}'")
+
+
+@perf.timed()
+def table_exists() -> bool:
+    with get_connection() as con:
+        return _table_exists(con, "horas")
+
+
+@perf.timed()
 def get_last_update() -> str | None:
-    if not table_exists():
-        return None
-    con = get_connection()
-    result = con.execute(
-        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'metadata'"
-    ).fetchone()
-    if result[0] == 0:
-        con.close()
-        return None
-    row = con.execute("SELECT updated_at FROM metadata ORDER BY updated_at DESC LIMIT 1").fetchone()
-    con.close()
+    with get_connection() as con:
+        if not _table_exists(con, "horas") or not _table_exists(con, "metadata"):
+            return None
+        row = con.execute("SELECT updated_at FROM metadata ORDER BY updated_at DESC LIMIT 1").fetchone()
     return row[0] if row else None
 
 
-def save_dataframe(df: pd.DataFrame) -> None:
-    con = get_connection()
-    con.execute("DROP TABLE IF EXISTS horas")
-    con.execute("CREATE TABLE horas AS SELECT * FROM df")
-    con.execute("DROP TABLE IF EXISTS metadata")
-    con.execute("CREATE TABLE metadata (updated_at VARCHAR)")
+def _touch_metadata(con: duckdb.DuckDBPyConnection, table_name: str = "metadata") -> None:
+    con.execute(f"DROP TABLE IF EXISTS {table_name}")
+    con.execute(f"CREATE TABLE {table_name} (updated_at VARCHAR)")
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    con.execute("INSERT INTO metadata VALUES (?)", [now])
-    con.close()
+    con.execute(f"INSERT INTO {table_name} VALUES (?)", [now])
 
 
-def load_dataframe() -> pd.DataFrame:
-    con = get_connection()
-    df = con.execute("SELECT * FROM horas WHERE regexp_matches(MES_ANO, '^\d{2}/\d{4}$')").df()
-    con.close()
+@perf.timed()
+@_serialized
+def save_dataframe(df: pd.DataFrame) -> None:
+    """Substitui ``horas``: grava numa tabela de staging e troca numa só transação."""
+    if ORIGIN_COLUMN not in df.columns:
+        df = df.assign(**{ORIGIN_COLUMN: LEGACY_ORIGIN})
+    df = _with_row_hash(df)
+    with get_connection() as con:
+        con.execute("DROP TABLE IF EXISTS horas_staging")
+        con.execute("CREATE TABLE horas_staging AS SELECT * FROM df")
+        with _transaction(con):
+            con.execute("DROP TABLE IF EXISTS horas")
+            con.execute("ALTER TABLE horas_staging RENAME TO horas")
+            # Posição de leitura das planilhas deixa de valer: volta a ser a maior LINHA gravada
+            con.execute(f"DROP TABLE IF EXISTS {SYNC_TABLE}")
+            _rebuild_rollups(con)
+            _touch_metadata(con)
+    invalidate_cache()
+    _snapshot_horas()
+
+
+@perf.timed()
+def get_last_synced_rows() -> dict[str, int]:
+    """Última linha já lida de cada planilha de origem (ponto de partida do incremental).
+
+    Vem de ``sync_estado``, que conta também as linhas descartadas por não
+    terem período válido; origens gravadas antes dele usam a maior LINHA em
+    ``horas``.
+    """
+    with get_connection() as con:
+        rows = {}
+        if set(ROW_KEYS) <= set(_columns(con, "horas")):
+            rows = dict(con.execute(
+                f"SELECT {ORIGIN_COLUMN}, max({ROW_KEY}) FROM horas GROUP BY {ORIGIN_COLUMN}"
+            ).fetchall())
+        if _table_exists(con, SYNC_TABLE):
+            rows.update(con.execute(f"SELECT {ORIGIN_COLUMN}, ULTIMA_LINHA FROM {SYNC_TABLE}").fetchall())
+    return rows
+
+
+def _save_sync_state(
+    con: duckdb.DuckDBPyConnection, lidas: dict[str, int], full: bool | Collection[str]
+) -> None:
+    """Atualiza ``sync_estado`` com ``lidas``; numa carga completa, as origens não lidas saem."""
+    if full is not True and not full and not lidas:
+        return
+    con.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_TABLE} ({ORIGIN_COLUMN} VARCHAR, ULTIMA_LINHA BIGINT)")
+    if full is True:
+        con.execute(f"DELETE FROM {SYNC_TABLE}")
+    else:
+        origens = sorted(set(full or ()) | set(lidas))
+        con.execute(f"DELETE FROM {SYNC_TABLE} WHERE list_contains(?::VARCHAR[], {ORIGIN_COLUMN})", [origens])
+    if lidas:
+        con.execute(
+            f"INSERT INTO {SYNC_TABLE} SELECT unnest(?::VARCHAR[]), unnest(?::BIGINT[])",
+            [list(lidas), list(lidas.values())],
+        )
+
+
+def _with_row_hash(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    # A origem fica fora do hash: ele reflete só o conteúdo da linha
+    df[ROW_HASH] = pd.util.hash_pandas_object(
+        df.drop(columns=[c for c in ROW_KEYS if c in df.columns]).astype(str), index=False
+    ).astype("uint64")
     return df
 
 
-def alocacao_exists() -> bool:
-    con = get_connection()
-    result = con.execute(
-        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'alocacao'"
+@perf.timed()
+@_serialized
+def upsert_batches(
+    batches: Iterable[pd.DataFrame],
+    full: bool | Collection[str] = False,
+    lidas: dict[str, int] | None = None,
+) -> int:
+    """Aplica os lotes em ``horas`` via MERGE por (ORIGEM, LINHA) numa única transação.
+
+    Retorna as linhas inseridas/alteradas; com ``full`` (True ou as origens lidas inteiras) apaga as que sumiram.
+    """
+    schema = None
+    with get_connection() as con:
+        con.execute("DROP TABLE IF EXISTS horas_sync")
+        for df in batches:
+            if ORIGIN_COLUMN not in df.columns:
+                df = df.assign(**{ORIGIN_COLUMN: LEGACY_ORIGIN})
+            df = _with_row_hash(df)
+            if schema is None:
+                batch = pa.Table.from_pandas(df, preserve_index=False)
+                schema = batch.schema
+                con.execute("CREATE TABLE horas_sync AS SELECT * FROM batch")
+            else:
+                batch = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                con.execute("INSERT INTO horas_sync SELECT * FROM batch")
+        if schema is None:
+            if lidas:
+                with _transaction(con):
+                    _save_sync_state(con, lidas, full)
+            return 0
+        with _transaction(con):
+            changed, removed = _merge_staging(con, full)
+            con.execute("DROP TABLE horas_sync")
+            _save_sync_state(con, lidas or {}, full)
+            if changed or removed:
+                _touch_metadata(con)
+    if not (changed or removed):
+        return 0
+    invalidate_cache()
+    _snapshot_horas()
+    return changed
+
+
+def _merge_staging(con: duckdb.DuckDBPyConnection, full: bool | Collection[str]) -> tuple[int, int]:
+    """Aplica ``horas_sync`` em ``horas``; devolve (linhas inseridas/atualizadas, linhas apagadas)."""
+    columns = _columns(con, "horas")
+    if sorted(columns) != sorted(_columns(con, "horas_sync")):
+        # Primeira carga ou layout da planilha mudou: recria a tabela
+        anteriores = con.execute("SELECT count(*) FROM horas").fetchone()[0] if columns else 0
+        con.execute("DROP TABLE IF EXISTS horas")
+        con.execute("CREATE TABLE horas AS SELECT * FROM horas_sync")
+        _rebuild_rollups(con)
+        return con.execute("SELECT count(*) FROM horas").fetchone()[0], anteriores
+
+    keys = ", ".join(ROW_KEYS)
+    on = " AND ".join(f"horas.{k} = novo.{k}" for k in ROW_KEYS)
+    # Linhas de horas que não vieram no staging e devem ser apagadas
+    removidas, params = None, []
+    if full is True:
+        removidas = f"({keys}) NOT IN (SELECT ({keys}) FROM horas_sync)"
+    elif full:
+        removidas = (
+            f"list_contains(?::VARCHAR[], {ORIGIN_COLUMN}) "
+            f"AND ({keys}) NOT IN (SELECT ({keys}) FROM horas_sync)"
+        )
+        params = [sorted(full)]
+
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE linhas_alteradas AS "
+        f"SELECT {', '.join(f'novo.{k}' for k in ROW_KEYS)} FROM horas_sync AS novo "
+        f"LEFT JOIN horas ON {on} WHERE horas.{ROW_HASH} IS DISTINCT FROM novo.{ROW_HASH}"
+    )
+    changed = con.execute("SELECT count(*) FROM linhas_alteradas").fetchone()[0]
+    removed = 0
+    if removidas:
+        con.execute(f"INSERT INTO linhas_alteradas SELECT {keys} FROM horas WHERE {removidas}", params)
+        removed = con.execute("SELECT count(*) FROM linhas_alteradas").fetchone()[0] - changed
+    rollup_keys = ", ".join(ROLLUP_KEYS)
+    alteradas = f"({keys}) IN (SELECT ({keys}) FROM linhas_alteradas)"
+    # Grupos afetados = chaves antigas (antes do MERGE) + novas (depois)
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE grupos_afetados AS SELECT DISTINCT {rollup_keys} FROM horas "
+        f"WHERE {alteradas}"
+    )
+    con.execute(
+        f"MERGE INTO horas USING horas_sync AS novo ON {on} "
+        f"WHEN MATCHED AND horas.{ROW_HASH} <> novo.{ROW_HASH} THEN UPDATE BY NAME "
+        f"WHEN NOT MATCHED THEN INSERT BY NAME"
+    )
+    if removidas:
+        con.execute(f"DELETE FROM horas WHERE {removidas}", params)
+    con.execute(
+        f"INSERT INTO grupos_afetados SELECT DISTINCT {rollup_keys} FROM horas_sync "
+        f"WHERE {alteradas}"
+    )
+    _refresh_rollups(con, "grupos_afetados")
+    con.execute("DROP TABLE linhas_alteradas")
+    con.execute("DROP TABLE grupos_afetados")
+    return changed, removed
+
+
+@_cached
+def load_dataframe() -> pd.DataFrame:
+    with get_connection() as con:
+        return _arrow_df(con.execute("SELECT * FROM horas"))
+
+
+def _where(filters: dict[str, list] | None) -> tuple[str, list]:
+    """Monta o WHERE parametrizado a partir das seleções dos filtros.
+
+    Uma lista vazia não casa nenhuma linha (mesma semântica do ``isin``);
+    ``None`` desliga o filtro da coluna.
+    """
+    clauses = ["TRUE"]
+    params = []
+    for col, values in (filters or {}).items():
+        if col not in FILTER_COLUMNS:
+            raise ValueError(f"Coluna de filtro inválida: {col}")
+        if values is None:
+            continue
+        clauses.append(f'list_contains(?::VARCHAR[], "{col}")')
+        params.append([str(v) for v in values])
+    return " AND ".join(clauses), params
+
+
+def _order_by(columns: list[str]) -> str:
+    # MES_ANO é só rótulo; a ordem cronológica vem do PERIODO (yyyymm)
+    return ", ".join("min(PERIODO)" if c == "MES_ANO" else f'"{c}"' for c in columns)
+
+
+@_cached
+def filter_options() -> dict[str, list[str]]:
+    """Valores distintos de cada coluna de filtro, já ordenados."""
+    with get_connection() as con:
+        options = {
+            col: [r[0] for r in con.execute(f'SELECT "{col}" FROM {table_name} ORDER BY 1').fetchall()]
+            for col, table_name in DIMENSIONS.items()
+            if col in FILTER_COLUMNS
+        }
+        options["MES_ANO"] = [
+            r[0] for r in con.execute("SELECT MES_ANO FROM dim_periodo ORDER BY PERIODO").fetchall()
+        ]
+    return options
+
+
+def _horas_kpis(con: duckdb.DuckDBPyConnection, filters: dict[str, list] | None) -> dict:
+    where, params = _where(filters)
+    registros, horas, profissionais = con.execute(
+        f"SELECT coalesce(sum(REGISTROS), 0), coalesce(sum(HORAS_EM_MINUTOS), 0), "
+        f"count(DISTINCT PROFISSIONAL) FROM rollup_horas WHERE {where}",
+        params,
     ).fetchone()
-    con.close()
-    return result[0] > 0
+    return {"registros": registros, "horas": horas, "profissionais": profissionais}
 
 
+@_cached
+def horas_kpis(filters: dict[str, list] | None = None) -> dict:
+    with get_connection() as con:
+        return _horas_kpis(con, filters)
+
+
+def _horas_por(
+    con: duckdb.DuckDBPyConnection, group_by: str | list[str], filters: dict[str, list] | None
+) -> pd.DataFrame:
+    columns = [group_by] if isinstance(group_by, str) else list(group_by)
+    for col in columns:
+        if col not in GROUP_COLUMNS:
+            raise ValueError(f"Coluna de agrupamento inválida: {col}")
+    select = ", ".join(f'"{c}"' for c in columns)
+    where, params = _where(filters)
+    return _arrow_df(con.execute(
+        f"SELECT {select}, sum(HORAS_EM_MINUTOS) AS HORAS_EM_MINUTOS FROM rollup_horas "
+        f"WHERE {where} GROUP BY {select} ORDER BY {_order_by(columns)}",
+        params,
+    ))
+
+
+@_cached
+def horas_por(group_by: str | list[str], filters: dict[str, list] | None = None) -> pd.DataFrame:
+    """Soma de HORAS_EM_MINUTOS agrupada pelas colunas pedidas, lida do rollup."""
+    with get_connection() as con:
+        return _horas_por(con, group_by, filters)
+
+
+@_cached
+def count_filtered(filters: dict[str, list] | None = None) -> int:
+    """Total exato de linhas de ``horas`` com os filtros do painel."""
+    where, params = _where(filters)
+    with get_connection() as con:
+        return con.execute(f"SELECT count(*) FROM horas WHERE {where}", params).fetchone()[0]
+
+
+@_cached
+def load_filtered_page(
+    filters: dict[str, list] | None = None, page: int = 0, page_size: int = 100
+) -> pd.DataFrame:
+    """Uma página das linhas de ``horas`` com os filtros do painel, em ordem de inserção (rowid)."""
+    where, params = _where(filters)
+    with get_connection() as con:
+        return _arrow_df(con.execute(
+            f"SELECT * FROM horas WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [page_size, page * page_size],
+        ))
+
+
+@perf.timed()
+def alocacao_exists() -> bool:
+    with get_connection() as con:
+        return _table_exists(con, "alocacao")
+
+
+@perf.timed()
+@_serialized
 def save_alocacao(df: pd.DataFrame) -> None:
-    con = get_connection()
-    con.execute("DROP TABLE IF EXISTS alocacao")
-    con.execute("CREATE TABLE alocacao AS SELECT * FROM df")
-    con.close()
+    with get_connection() as con, _transaction(con):
+        con.execute("DROP TABLE IF EXISTS alocacao")
+        con.execute("CREATE TABLE alocacao AS SELECT * FROM df")
+        _touch_metadata(con, "metadata_alocacao")
+    invalidate_cache()
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _alocacao_csv(con: duckdb.DuckDBPyConnection, path: str) -> str:
+    """SELECT tipado sobre o CSV de alocação (o parâmetro ``?`` é o caminho).
+
+    O leitor CSV do DuckDB (paralelo) detecta separador, cabeçalho e tipos
+    numa amostra de ``CSV_SAMPLE_SIZE`` linhas. As chaves (``ALOCACAO_TEXTO``)
+    ficam sempre como texto; as colunas numéricas do contrato são lidas como
+    texto e convertidas aqui, aceitando vírgula decimal. Levanta
+    ``ValueError`` se faltar coluna exigida.
+    """
+    reader = f"read_csv(?, sample_size = {CSV_SAMPLE_SIZE})"
+    colunas = [c[0] for c in con.execute(f"DESCRIBE SELECT * FROM {reader}", [path]).fetchall()]
+    faltando = [c for c in ALOCACAO_COLUNAS if c not in colunas]
+    if faltando:
+        raise ValueError(
+            f"CSV de alocação sem as colunas {', '.join(faltando)} (encontradas: {', '.join(colunas)})"
+        )
+    numericas = [c for c in ALOCACAO_NUMERICAS if c in colunas]
+    texto = [c for c in ALOCACAO_TEXTO if c in colunas]
+    types = ", ".join(f"'{c}': 'VARCHAR'" for c in [*numericas, *texto])
+    select = ", ".join(
+        f"coalesce(TRY_CAST(replace(trim({_ident(c)}), ',', '.') AS DOUBLE), 0) AS {_ident(c)}"
+        if c in numericas else _ident(c)
+        for c in colunas
+    )
+    return f"SELECT {select} FROM read_csv(?, sample_size = {CSV_SAMPLE_SIZE}, types = {{{types}}})"
+
+
+@perf.timed()
+def preview_alocacao_csv(path: str, limit: int = 10) -> pd.DataFrame:
+    """Primeiras linhas do CSV já tipadas pelo contrato, sem ler o arquivo inteiro."""
+    with get_connection() as con:
+        return _arrow_df(con.execute(f"{_alocacao_csv(con, path)} LIMIT {int(limit)}", [path]))
+
+
+@perf.timed()
+@_serialized
+def save_alocacao_csv(path: str) -> int:
+    """Substitui ``alocacao`` pelo CSV em ``path``, lido direto pelo DuckDB; devolve o total de linhas."""
+    with get_connection() as con, _transaction(con):
+        con.execute(f"CREATE OR REPLACE TABLE alocacao AS {_alocacao_csv(con, path)}", [path])
+        total = con.execute("SELECT count(*) FROM alocacao").fetchone()[0]
+        _touch_metadata(con, "metadata_alocacao")
+    invalidate_cache()
+    return total
 
 
+@_cached
 def load_alocacao() -> pd.DataFrame:
-    con = get_connection()
-    df = con.execute("SELECT * FROM alocacao").df()
-    con.close()
-    return df
+    with get_connection() as con:
+        return _arrow_df(con.execute("SELECT * FROM alocacao"))
+
+
+@perf.timed()
+def alocacao_versoes() -> dict[int, dict]:
+    """Arquivo carregado por último em cada período presente em ``alocacao``.
+
+    Vazio se a alocação atual não for por período (ex.: veio de upload manual).
+    """
+    with get_connection() as con:
+        if not _table_exists(con, "alocacao_arquivos") or "PERIODO" not in _columns(con, "alocacao"):
+            return {}
+        rows = con.execute(
+            """
+            SELECT PERIODO, arg_max(struct_pack(ID, NOME, MD5, MODIFIED_TIME, CARREGADO_EM), CARREGADO_EM)
+            FROM alocacao_arquivos
+            WHERE PERIODO IN (SELECT DISTINCT PERIODO FROM alocacao)
+            GROUP BY PERIODO
+            """
+        ).fetchall()
+    return {periodo: versao for periodo, versao in rows}
+
+
+@perf.timed()
+@_serialized
+def save_alocacao_periodos(paths: dict[int, str], arquivos: list[dict]) -> dict[int, int]:
+    """Substitui em ``alocacao`` as linhas de cada período pelo CSV dele, numa transação.
+
+    ``paths`` mapeia o período (AAAAMM) ao CSV, lido como em
+    ``save_alocacao_csv``. As linhas recebem a coluna PERIODO e os demais
+    períodos são mantidos; uma alocação sem PERIODO (upload manual) é
+    substituída inteira. ``arquivos`` (ID, NOME, PERIODO, MD5, MODIFIED_TIME)
+    vai para o histórico ``alocacao_arquivos``. Devolve as linhas por período.
+    """
+    with get_connection() as con, _transaction(con):
+        selects, params = [], []
+        for periodo, path in paths.items():
+            selects.append(f"SELECT *, CAST({int(periodo)} AS INTEGER) AS PERIODO FROM ({_alocacao_csv(con, path)})")
+            params.append(path)
+        con.execute(
+            f"CREATE OR REPLACE TEMP TABLE alocacao_nova AS {' UNION ALL BY NAME '.join(selects)}", params
+        )
+        if _table_exists(con, "alocacao") and "PERIODO" in _columns(con, "alocacao"):
+            con.execute(
+                """
+                CREATE OR REPLACE TABLE alocacao AS
+                SELECT * FROM alocacao WHERE PERIODO NOT IN (SELECT PERIODO FROM alocacao_nova)
+                UNION ALL BY NAME
+                SELECT * FROM alocacao_nova
+                """
+            )
+        else:
+            con.execute("CREATE OR REPLACE TABLE alocacao AS SELECT * FROM alocacao_nova")
+        linhas = dict(con.execute("SELECT PERIODO, count(*) FROM alocacao_nova GROUP BY 1").fetchall())
+        historico = pd.DataFrame(arquivos, columns=["ID", "NOME", "PERIODO", "MD5", "MODIFIED_TIME"])
+        historico["LINHAS"] = historico["PERIODO"].map(linhas).fillna(0).astype("int64")
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alocacao_arquivos (
+                ID VARCHAR, NOME VARCHAR, PERIODO INTEGER, MD5 VARCHAR,
+                MODIFIED_TIME VARCHAR, LINHAS BIGINT, CARREGADO_EM TIMESTAMP
+            )
+            """
+        )
+        con.execute("INSERT INTO alocacao_arquivos SELECT *, current_localtimestamp() FROM historico")
+        con.execute("DROP TABLE alocacao_nova")
+        _touch_metadata(con, "metadata_alocacao")
+    invalidate_cache()
+    return linhas
+
+
+def _alocacao_where(filters: dict[str, list] | None, por_periodo: bool) -> tuple[str, list]:
+    """WHERE sobre ``alocacao`` (alias ``a``) com os mesmos filtros do painel."""
+    clauses = ["TRUE"]
+    params = []
+    for col, values in (filters or {}).items():
+        if values is None:
+            continue
+        if col == "MES_ANO":
+            if not por_periodo:
+                continue
+            clauses.append(
+                "a.PERIODO IN (SELECT PERIODO FROM dim_periodo WHERE list_contains(?::VARCHAR[], MES_ANO))"
+            )
+        else:
+            clauses.append(f"list_contains(?::VARCHAR[], a.{ALOCACAO_KEYS[col]})")
+        params.append([str(v) for v in values])
+    return " AND ".join(clauses), params
+
 
+def _comparativo_alocacao(
+    con: duckdb.DuckDBPyConnection, filters: dict[str, list] | None, todas_alocacoes: bool
+) -> pd.DataFrame:
+    por_periodo = "PERIODO" in _columns(con, "alocacao")
+    keys = ["PROFISSIONAL", "CLIENTE_CONCATENADO"] + (["PERIODO"] if por_periodo else [])
+    join = " AND ".join(f"g.{k} = a.{ALOCACAO_KEYS.get(k, k)}" for k in keys)
+    where, params = _where(filters)
+    aloc_where, aloc_params = _alocacao_where(None if todas_alocacoes else filters, por_periodo)
+    return _arrow_df(con.execute(
+        f"""
+        WITH gastas AS (
+            SELECT {", ".join(keys)}, sum(HORAS_EM_MINUTOS) AS HORAS_GASTAS
+            FROM rollup_horas WHERE {where} GROUP BY ALL
+        ), comparativo AS (
+            SELECT a.*, a.rowid AS _ORDEM,
+                a.MES_ATUAL / 100 * a.HORAS_MES AS HORAS_ALOCADAS,
+                round(coalesce(g.HORAS_GASTAS, 0), 1) AS HORAS_GASTAS
+            FROM alocacao AS a LEFT JOIN gastas AS g ON {join}
+            WHERE {aloc_where}
+        )
+        SELECT * EXCLUDE (_ORDEM),
+            round(HORAS_ALOCADAS - HORAS_GASTAS, 1) AS HORAS_RESTANTES,
+            CASE WHEN HORAS_ALOCADAS > 0 THEN HORAS_GASTAS / HORAS_ALOCADAS * 100 ELSE 0 END AS PCT_USADO,
+            CASE WHEN PCT_USADO > 100 THEN 'Excedido' WHEN PCT_USADO >= 90 THEN 'Atenção'
+                 ELSE 'No prazo' END AS STATUS
+        FROM comparativo ORDER BY _ORDEM
+        """,
+        params + aloc_params,
+    ))
 
+
+@_cached
+def comparativo_alocacao(
+    filters: dict[str, list] | None = None, todas_alocacoes: bool = False
+) -> pd.DataFrame:
+    """Alocação vs realizado em uma consulta, na ordem das linhas da alocação.
+
+    Junta ``alocacao`` às horas do rollup pela chave (profissional, cliente e,
+    se a alocação tiver ``PERIODO``, período). Devolve as colunas da alocação
+    mais HORAS_ALOCADAS, HORAS_GASTAS, HORAS_RESTANTES (pode ser negativa),
+    PCT_USADO e STATUS (``Excedido`` > 100%, ``Atenção`` >= 90%, ``No prazo``).
+    Com ``todas_alocacoes`` os filtros restringem só as horas gastas, e
+    alocações sem horas no filtro aparecem zeradas.
+    """
+    with get_connection() as con:
+        return _comparativo_alocacao(con, filters, todas_alocacoes)
+
+
+def dados_relatorio(
+    con: duckdb.DuckDBPyConnection, filters: dict[str, list] | None, todas_alocacoes: bool = True
+) -> dict:
+    """Argumentos de ``relatorio.render`` para os filtros, lidos do rollup em ``con``.
+
+    Recebe a conexão para servir tanto ao banco do app quanto às cópias em
+    memória da geração em lote (``report_base``/``report_connection``).
+    """
+    return {
+        "periodos": _horas_por(con, "MES_ANO", filters)["MES_ANO"].tolist(),
+        "kpis": _horas_kpis(con, filters),
+        "horas_profissional": (
+            _horas_por(con, "PROFISSIONAL", filters)
+            .set_index("PROFISSIONAL")["HORAS_EM_MINUTOS"]
+            .sort_values(ascending=False)
+        ),
+        "horas_cliente": (
+            _horas_por(con, "CLIENTE_CONCATENADO", filters)
+            .set_index("CLIENTE_CONCATENADO")["HORAS_EM_MINUTOS"]
+            .sort_values(ascending=False)
+        ),
+        "comparativo": (
+            _comparativo_alocacao(con, filters, todas_alocacoes)
+            if _table_exists(con, "alocacao") else None
+        ),
+    }
+
+
+# Tabelas (já agregadas) de que o relatório precisa
+REPORT_TABLES = ("rollup_horas", "dim_periodo", "alocacao")
+
+
+def report_base() -> dict[str, pa.Table]:
+    """Lê uma vez as tabelas do relatório como Arrow, para repassar a outros processos."""
+    with get_connection() as con:
+        return {
+            name: con.execute(f"SELECT * FROM {name}").fetch_arrow_table()
+            for name in REPORT_TABLES
+            if _table_exists(con, name)
+        }
+
+
+def report_connection(base: dict[str, pa.Table]) -> duckdb.DuckDBPyConnection:
+    """Banco em memória com as tabelas de ``report_base``, para ``dados_relatorio``."""
+    con = duckdb.connect()
+    for name, arrow in base.items():
+        con.execute(f"CREATE TABLE {name} AS SELECT * FROM arrow")
+    return con
+
+
+@perf.timed()
 def list_tables() -> list[str]:
-    con = get_connection()
-    tables = con.execute(
-        "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'"
-    ).fetchall()
-    con.close()
+    with get_connection() as con:
+        tables = con.execute(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'"
+        ).fetchall()
     return [t[0] for t in tables]
 
 
-def load_table(table_name: str) -> pd.DataFrame:
-    con = get_connection()
-    # Usa aspas duplas para proteger o nome da tabela
-    df = con.execute(f'SELECT * FROM "{table_name}"').df()
-    con.close()
-    return df
+# --- Explorador de dados: acesso paginado ---
+
+_NUMERIC_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL",
+)
+# Acima disso a coluna de texto é filtrada por busca em vez de lista de valores
+MAX_DISTINCT_VALUES = 500
+
+
+def table_columns(table_name: str) -> dict[str, str]:
+    """Colunas da tabela e seus tipos DuckDB, na ordem da tabela."""
+    with get_connection() as con:
+        if table_name not in list_tables():
+            raise ValueError(f"Tabela inexistente: {table_name}")
+        return {c[0]: c[1] for c in con.execute(f'DESCRIBE "{table_name}"').fetchall()}
+
+
+def is_numeric(column_type: str) -> bool:
+    return column_type.split("(")[0] in _NUMERIC_TYPES
+
+
+@_cached
+def column_stats(table_name: str, column: str) -> dict:
+    """Estatísticas para montar o filtro da coluna: min/max ou valores distintos."""
+    column_type = table_columns(table_name)[column]
+    with get_connection() as con:
+        if is_numeric(column_type):
+            vmin, vmax = con.execute(
+                f'SELECT min("{column}"), max("{column}") FROM "{table_name}"'
+            ).fetchone()
+            return {"numeric": True, "min": vmin, "max": vmax}
+        rows = con.execute(
+            f'SELECT DISTINCT CAST("{column}" AS VARCHAR) FROM "{table_name}" '
+            f'WHERE "{column}" IS NOT NULL ORDER BY 1 LIMIT {MAX_DISTINCT_VALUES + 1}'
+        ).fetchall()
+    values = [r[0] for r in rows]
+    return {
+        "numeric": False,
+        "values": values[:MAX_DISTINCT_VALUES],
+        "truncated": len(values) > MAX_DISTINCT_VALUES,
+    }
+
+
+def _table_where(table_name: str, filters: dict | None) -> tuple[str, list]:
+    """WHERE parametrizado do explorador.
+
+    Cada filtro pode ser uma lista (IN), uma tupla ``(min, max)`` (BETWEEN)
+    ou um texto (busca ILIKE).
+    """
+    columns = table_columns(table_name)
+    clauses = ["TRUE"]
+    params = []
+    for col, value in (filters or {}).items():
+        if col not in columns:
+            raise ValueError(f"Coluna inexistente em {table_name}: {col}")
+        if isinstance(value, tuple):
+            clauses.append(f'"{col}" BETWEEN ? AND ?')
+            params.extend(value)
+        elif isinstance(value, str):
+            clauses.append(f'CAST("{col}" AS VARCHAR) ILIKE ?')
+            params.append(f"%{value}%")
+        else:
+            clauses.append(f'list_contains(?::VARCHAR[], CAST("{col}" AS VARCHAR))')
+            params.append([str(v) for v in value])
+    return " AND ".join(clauses), params
+
+
+@_cached
+def count_table(table_name: str, filters: dict | None = None) -> int:
+    where, params = _table_where(table_name, filters)
+    with get_connection() as con:
+        return con.execute(f'SELECT count(*) FROM "{table_name}" WHERE {where}', params).fetchone()[0]
+
+
+@_cached
+def load_table_page(
+    table_name: str, filters: dict | None = None, page: int = 0, page_size: int = 100
+) -> pd.DataFrame:
+    """Uma página da tabela filtrada, em ordem estável de inserção (rowid)."""
+    where, params = _table_where(table_name, filters)
+    with get_connection() as con:
+        return _arrow_df(con.execute(
+            f'SELECT * FROM "{table_name}" WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?',
+            params + [page_size, page * page_size],
+        ))
+
+
+# --- Snapshots Parquet de cada importação ---
+
+def snapshot_dir() -> str:
+    return os.path.join(os.path.dirname(_manager.path), "snapshots")
+
+
+def planilhas_cache_dir() -> str:
+    """Cache dos dados brutos baixados de cada planilha (ver ``cache_planilhas``)."""
+    return os.path.join(os.path.dirname(_manager.path), "planilhas")
+
+
+def _snapshot_horas() -> None:
+    """Registra o estado de ``horas`` após uma importação; falha aqui não desfaz a carga."""
+    try:
+        with get_connection() as con:
+            snapshots.write_snapshot(con, snapshot_dir())
+    except Exception:
+        logger.exception("Falha ao gravar snapshot de horas")
+
+
+@perf.timed()
+def list_snapshots() -> list[dict]:
+    return snapshots.list_snapshots(snapshot_dir())
+
+
+def _snapshot_columns(con: duckdb.DuckDBPyConnection, version: int) -> list[str]:
+    source = snapshots.snapshot_source(snapshot_dir(), version)
+    return [c[0] for c in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+
+
+@_cached
+def load_snapshot(
+    version: int, filters: dict[str, list] | None = None, page: int = 0, page_size: int = 100
+) -> pd.DataFrame:
+    """Uma página de ``horas`` como estava na versão pedida, lida direto do Parquet."""
+    where, params = _where(filters)
+    source = snapshots.snapshot_source(snapshot_dir(), version)
+    with get_connection() as con:
+        order = ", ".join(k for k in ROW_KEYS if k in _snapshot_columns(con, version)) or "ALL"
+        return _arrow_df(con.execute(
+            f"SELECT * FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [page_size, page * page_size],
+        ))
+
+
+@_cached
+def diff_snapshots(old: int, new: int) -> pd.DataFrame:
+    """Linhas incluídas, alteradas ou removidas entre duas versões."""
+    with get_connection() as con:
+        columns = [_snapshot_columns(con, v) for v in (old, new)]
+        # Snapshots antigos podem não ter ORIGEM ou HASH_LINHA: compara pelo que as duas versões têm
+        keys = [k for k in ROW_KEYS if all(k in c for c in columns)] if all(ROW_KEY in c for c in columns) else []
+        if all(ROW_HASH in c for c in columns):
+            compare = [ROW_HASH]
+        else:
+            compare = [c for c in columns[0] if c in columns[1] and c not in ROW_KEYS]
+        return _arrow_df(con.execute(snapshots.diff_query(snapshot_dir(), old, new, keys, compare)))
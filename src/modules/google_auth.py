@@ -8,6 +8,7 @@ class GoogleAuth:
         "sheets.readonly": ["https://www.googleapis.com/auth/spreadsheets.readonly"],
         "drive": ["https://www.googleapis.com/auth/drive"],
         "drive.readonly": ["https://www.googleapis.com/auth/drive.readonly"],
+        "drive.metadata.readonly": ["https://www.googleapis.com/auth/drive.metadata.readonly"],
     }
 
     def __init__(self, credentials_path: str, scopes: list[str]):
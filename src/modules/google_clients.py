@@ -0,0 +1,90 @@
+import os
+import threading
+
+import requests
+from google.auth.transport.requests import AuthorizedSession
+
+from google_auth import GoogleAuth
+from google_sheets import GoogleSheetsClient
+
+# Conexões keep-alive por host na sessão HTTP do Sheets (cobre as planilhas lidas em paralelo)
+HTTP_POOL_SIZE = 16
+
+
+def _substituir(cache: dict, key: tuple, value):
+    """Guarda ``value`` em ``key`` e descarta as versões anteriores do mesmo arquivo/escopos."""
+    for antiga in [k for k in cache if k[0] == key[0] and k[2:] == key[2:]]:
+        del cache[antiga]
+    cache[key] = value
+    return value
+
+
+class GoogleClients:
+    """Credenciais e clientes Google reaproveitados entre atualizações e sessões.
+
+    As credenciais ficam em memória por arquivo e escopos (relidas só se o
+    arquivo mudar), então o access token é reutilizado até expirar e a
+    google-auth o renova sozinha. O cliente do Sheets usa uma sessão HTTP
+    com pool de conexões keep-alive compartilhada entre threads e guarda as
+    planilhas já abertas. O cliente do Drive não é thread-safe: fica um por
+    thread, reaproveitado nas chamadas seguintes da mesma thread.
+    """
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._auths: dict[tuple, GoogleAuth] = {}
+        self._sheets: dict[tuple, GoogleSheetsClient] = {}
+        self._local = threading.local()
+
+    def _key(self, credentials_path: str, scopes: list[str]) -> tuple:
+        path = os.path.abspath(credentials_path)
+        return path, os.stat(path).st_mtime_ns, tuple(scopes)
+
+    def auth(self, credentials_path: str, scopes: list[str]) -> GoogleAuth:
+        key = self._key(credentials_path, scopes)
+        with self._lock:
+            auth = self._auths.get(key)
+            if auth is None:
+                auth = _substituir(self._auths, key, GoogleAuth.for_services(credentials_path, scopes))
+            return auth
+
+    def sheets(self, credentials_path: str = "credentials.json", readonly: bool = False) -> GoogleSheetsClient:
+        scopes = GoogleAuth.SCOPES["sheets.readonly" if readonly else "sheets"]
+        key = self._key(credentials_path, scopes)
+        with self._lock:
+            client = self._sheets.get(key)
+        if client is not None:
+            return client
+        auth = self.auth(credentials_path, scopes)
+        session = AuthorizedSession(auth.credentials)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        with self._lock:
+            if key not in self._sheets:
+                _substituir(self._sheets, key, GoogleSheetsClient(auth, session=session))
+            return self._sheets[key]
+
+    def drive(self, credentials_path: str = "credentials.json", scopes: list[str] | None = None):
+        """Cliente do Drive desta thread (importado aqui: a biblioteca só é exigida por quem usa o Drive)."""
+        from google_drive import GoogleDriveClient
+
+        scopes = scopes or GoogleAuth.SCOPES["drive.readonly"]
+        key = self._key(credentials_path, scopes)
+        clients = getattr(self._local, "drive", None)
+        if clients is None:
+            clients = self._local.drive = {}
+        client = clients.get(key)
+        if client is None:
+            client = _substituir(clients, key, GoogleDriveClient(self.auth(credentials_path, scopes)))
+        return client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._auths.clear()
+            self._sheets.clear()
+        self._local = threading.local()
+
+
+# Registro único do processo (sessões do Streamlit, worker de sincronização e CLI)
+clients = GoogleClients()
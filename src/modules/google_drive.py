@@ -1,11 +1,19 @@
+import os
+from collections.abc import Iterator
+
 from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseDownload
+
+from google_auth import GoogleAuth
 
-from src.modules.google_auth import GoogleAuth
+FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size"
 
 
 class GoogleDriveClient:
     """
-    Falta implementar
+    Listagem e download de arquivos do Google Drive.
+
+    O cliente da API não é thread-safe: use uma instância por thread.
     """
     def __init__(self, auth: GoogleAuth):
         self.service = build("drive", "v3", credentials=auth.credentials)
@@ -18,5 +26,44 @@ class GoogleDriveClient:
         ).execute()
         return results.get("files", [])
 
+    def iter_files(
+        self, query: str | None = None, page_size: int = 1000, fields: str = FILE_FIELDS
+    ) -> Iterator[dict]:
+        """Todos os arquivos da consulta, página a página (``nextPageToken``)."""
+        token = None
+        while True:
+            results = self.service.files().list(
+                q=query,
+                pageSize=page_size,
+                pageToken=token,
+                fields=f"nextPageToken, files({fields})",
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            yield from results.get("files", [])
+            token = results.get("nextPageToken")
+            if not token:
+                return
+
+    def iter_folder(self, folder_id: str, page_size: int = 1000) -> Iterator[dict]:
+        """Arquivos (não apagados) diretamente dentro da pasta."""
+        return self.iter_files(f"'{folder_id}' in parents and trashed = false", page_size)
+
+    def modified_time(self, file_id: str) -> str:
+        """Data da última alteração do arquivo (RFC 3339), sem baixar o conteúdo."""
+        return self.service.files().get(
+            fileId=file_id, fields="modifiedTime", supportsAllDrives=True
+        ).execute()["modifiedTime"]
+
     def download_file(self, file_id: str) -> bytes:
         return self.service.files().get_media(fileId=file_id).execute()
+
+    def download_to(self, file_id: str, path: str, chunk_size: int = 4 * 1024 * 1024) -> int:
+        """Baixa o arquivo para ``path`` em pedaços de ``chunk_size`` bytes; devolve o tamanho."""
+        request = self.service.files().get_media(fileId=file_id, supportsAllDrives=True)
+        with open(path, "wb") as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=chunk_size)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk(num_retries=3)
+        return os.path.getsize(path)
@@ -1,24 +1,134 @@
+import logging
+import threading
+from collections.abc import Iterator
+
 import gspread
 import pandas as pd
+import requests
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 from google_auth import GoogleAuth
 
+logger = logging.getLogger(__name__)
+
+# Cota estourada (429) e falhas temporárias do servidor valem nova tentativa
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _transient(exc: BaseException) -> bool:
+    if isinstance(exc, gspread.exceptions.APIError):
+        return exc.response.status_code in RETRY_STATUS
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+@retry(
+    retry=retry_if_exception(_transient),
+    wait=wait_exponential_jitter(initial=1, max=60),
+    stop=stop_after_attempt(6),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+def _call(func, *args, **kwargs):
+    """Chama a API do Sheets com backoff exponencial (com jitter) em erros de cota."""
+    return func(*args, **kwargs)
+
 
 class GoogleSheetsClient:
+    """
+    Leitura de abas do Google Sheets.
 
-    def __init__(self, auth: GoogleAuth):
-        self.client = gspread.authorize(auth.credentials)
+    As planilhas abertas (``open_by_key``) ficam guardadas e são reusadas;
+    cada aba é buscada de novo, para refletir linhas adicionadas. ``session``
+    permite passar uma sessão HTTP autenticada própria (pool de conexões).
+    """
+
+    def __init__(self, auth: GoogleAuth, session: requests.Session | None = None):
+        self.client = gspread.authorize(auth.credentials, session=session)
+        self._planilhas: dict[str, gspread.Spreadsheet] = {}
+        self._abrindo: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
 
     def open_sheet(self, sheet_id: str) -> gspread.Spreadsheet:
-        return self.client.open_by_key(sheet_id)
+        with self._lock:
+            abrindo = self._abrindo.setdefault(sheet_id, threading.Lock())
+        # Abas da mesma planilha lidas em paralelo esperam uma única abertura
+        with abrindo:
+            with self._lock:
+                sheet = self._planilhas.get(sheet_id)
+            if sheet is None:
+                sheet = _call(self.client.open_by_key, sheet_id)
+                with self._lock:
+                    self._planilhas[sheet_id] = sheet
+        return sheet
+
+    def forget_sheet(self, sheet_id: str) -> None:
+        with self._lock:
+            self._planilhas.pop(sheet_id, None)
+
+    def open_worksheet(self, sheet_id: str, worksheet_name: str) -> gspread.Worksheet:
+        try:
+            return _call(self.open_sheet(sheet_id).worksheet, worksheet_name)
+        except gspread.exceptions.APIError:
+            # Planilha apagada ou acesso revogado: a próxima chamada abre de novo
+            self.forget_sheet(sheet_id)
+            raise
 
     def list_worksheets(self, sheet_id: str) -> list[str]:
         sheet = self.open_sheet(sheet_id)
-        return [ws.title for ws in sheet.worksheets()]
+        return [ws.title for ws in _call(sheet.worksheets)]
 
-    def worksheet_to_df(self, sheet_id: str, worksheet_name: str) -> pd.DataFrame:
-        sheet = self.open_sheet(sheet_id)
-        data = sheet.worksheet(worksheet_name).get_all_values()
-        if not data:
-            return pd.DataFrame()
-        return pd.DataFrame(columns=data[0], data=data[1:])
+    def worksheet_to_df(self, sheet_id: str, worksheet_name: str, start_row: int = 2) -> pd.DataFrame:
+        """Lê a aba a partir de ``start_row`` (a linha 1 é o cabeçalho).
+
+        A coluna LINHA guarda o número da linha na planilha, usado como chave
+        na sincronização incremental.
+        """
+        worksheet = self.open_worksheet(sheet_id, worksheet_name)
+        if start_row <= 2:
+            data = _call(worksheet.get_all_values)
+            if not data:
+                return pd.DataFrame()
+            header, rows, start_row = data[0], data[1:], 2
+        else:
+            header = _call(worksheet.row_values, 1)
+            if not header:
+                return pd.DataFrame()
+            if start_row > worksheet.row_count:
+                rows = []
+            else:
+                last_cell = gspread.utils.rowcol_to_a1(worksheet.row_count, len(header))
+                rows = _call(worksheet.get, f"A{start_row}:{last_cell}")
+            rows = [row + [""] * (len(header) - len(row)) for row in rows]
+        df = pd.DataFrame(columns=header, data=rows)
+        df["LINHA"] = range(start_row, start_row + len(df))
+        return df
+
+    def iter_worksheet_chunks(
+        self, sheet_id: str, worksheet_name: str, start_row: int = 2, chunk_size: int = 5000
+    ) -> Iterator[pd.DataFrame]:
+        """Lê a aba em faixas de ``chunk_size`` linhas, sem materializar a planilha inteira.
+
+        Cada pedaço traz a coluna LINHA, como em ``worksheet_to_df``. Faixas
+        vazias são puladas e a leitura vai até o ``row_count`` da aba.
+        """
+        worksheet = self.open_worksheet(sheet_id, worksheet_name)
+        header = _call(worksheet.row_values, 1)
+        if not header:
+            return
+        start_row = max(start_row, 2)
+        for first in range(start_row, worksheet.row_count + 1, chunk_size):
+            last = min(first + chunk_size - 1, worksheet.row_count)
+            rows = _call(worksheet.get, f"A{first}:{gspread.utils.rowcol_to_a1(last, len(header))}")
+            if not rows:
+                # Bloco de linhas em branco no meio da aba: ainda pode haver dados depois dele
+                continue
+            rows = [row + [""] * (len(header) - len(row)) for row in rows]
+            df = pd.DataFrame(columns=header, data=rows)
+            df["LINHA"] = range(first, first + len(df))
+            yield df
@@ -1,24 +1,49 @@
+import logging
+from collections.abc import Iterable
+
 from google_auth import GoogleAuth
-from google_sheets import GoogleSheetsClient
+from google_clients import clients
+
+logger = logging.getLogger(__name__)
 
 
 class GSGoldenBagres:
     def __init__(self, sheet_id: str, worksheet: str,show_ = bool ):
-        auth = GoogleAuth.for_sheets()
-        self.sheets = GoogleSheetsClient(auth)
+        self.sheets = clients.sheets()
         self.sheet_id = sheet_id
         self.worksheet = worksheet
         self.show_ = show_
 
-    def start(self):
-        worksheets = self.sheets.list_worksheets(self.sheet_id)
-
-        df = self.sheets.worksheet_to_df(self.sheet_id, self.worksheet)
+    def start(self, start_row: int = 2):
+        df = self.sheets.worksheet_to_df(self.sheet_id, self.worksheet, start_row=start_row)
         if self.show_ == True:
-            print(worksheets)
             print(df)
         return df
 
+    def iter_chunks(self, start_row: int = 2, chunk_size: int = 5000):
+        return self.sheets.iter_worksheet_chunks(
+            self.sheet_id, self.worksheet, start_row=start_row, chunk_size=chunk_size
+        )
+
+
+def drive_client(credentials_path: str = "credentials.json", readonly: bool = True):
+    """Cliente do Google Drive da thread atual, reaproveitado pelo registro ``clients``."""
+    return clients.drive(credentials_path, GoogleAuth.SCOPES["drive.readonly" if readonly else "drive"])
+
+
+def modified_times(sheet_ids: Iterable[str], credentials_path: str = "credentials.json") -> dict[str, str]:
+    """``modifiedTime`` de cada planilha no Drive, sem baixar as abas.
+
+    Sem acesso ao Drive (biblioteca ausente, escopo ou API não liberados)
+    devolve vazio e a detecção de mudança fica só pelo hash do conteúdo.
+    """
+    try:
+        drive = clients.drive(credentials_path, GoogleAuth.SCOPES["drive.metadata.readonly"])
+        return {sheet_id: drive.modified_time(sheet_id) for sheet_id in dict.fromkeys(sheet_ids)}
+    except Exception as e:
+        logger.warning("Data de alteração das planilhas indisponível no Drive: %s", e)
+        return {}
+
 
 if __name__ == '__main__':
     sid = '1ej9meDW8js9sPvqylB9eNbNLp3-phJlb7UE8j_BPvFk'
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import tornado.web
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros de query -> colunas de filtro do data_store (podem se repetir: ?profissional=A&profissional=B)
+FILTER_PARAMS = {
+    "profissional": "PROFISSIONAL",
+    "cliente": "CLIENTE_CONCATENADO",
+    "periodo": "MES_ANO",
+}
+# Dimensões de /api/horas/<dimensao>
+DIMENSIONS = {
+    "profissional": "PROFISSIONAL",
+    "cliente": "CLIENTE_CONCATENADO",
+    "periodo": "MES_ANO",
+    "area": "AREA",
+}
+MAX_PAGE_SIZE = 1000
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+class BaseHandler(tornado.web.RequestHandler, ABC):
+    """Resposta JSON com ETag derivado da versão dos dados e da URL.
+
+    O ETag é calculado antes da consulta: um ``If-None-Match`` igual devolve
+    304 sem tocar no banco, e o corpo já serializado fica em cache até a
+    próxima mudança de versão.
+    """
+
+    def initialize(self, store, cache: ResultCache):
+        self.store = store
+        self.cache = cache
+        self._etag = None
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        # Clientes podem guardar a resposta, mas devem revalidar (barato, via ETag)
+        self.set_header("Cache-Control", "no-cache")
+
+    def compute_etag(self):
+        return self._etag
+
+    def filters(self) -> dict[str, list] | None:
+        filters = {
+            col: self.get_query_arguments(param)
+            for param, col in FILTER_PARAMS.items()
+            if self.get_query_arguments(param)
+        }
+        return filters or None
+
+    @abstractmethod
+    def payload(self, *args):
+        """Conteúdo da resposta (serializável em JSON) para os argumentos da rota."""
+
+    async def get(self, *args):
+        loop = IOLoop.current()
+        version = await loop.run_in_executor(None, self.store.get_data_version)
+        self._etag = '"' + hashlib.sha1(repr((version, self.request.uri)).encode()).hexdigest() + '"'
+        self.set_etag_header()
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        try:
+            body = await loop.run_in_executor(
+                None,
+                lambda: self.cache.get_or_compute(
+                    self._etag, lambda: json.dumps(self.payload(*args), ensure_ascii=False, default=str)
+                ),
+            )
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+        self.write(body)
+
+    def write_error(self, status_code, **kwargs):
+        self.finish(json.dumps({"erro": self._reason, "status": status_code}, ensure_ascii=False))
+
+
+class VersaoHandler(BaseHandler):
+    def payload(self):
+        return {"versao": self.store.get_data_version(), "ultima_atualizacao": self.store.get_last_update()}
+
+
+class TotaisHandler(BaseHandler):
+    def payload(self):
+        return self.store.horas_kpis(self.filters())
+
+
+class HorasPorHandler(BaseHandler):
+    def payload(self, dimensao):
+        group_by = [DIMENSIONS[d] for d in dimensao.split(",") if d in DIMENSIONS]
+        if not group_by or len(group_by) != len(dimensao.split(",")):
+            raise ValueError(f"Dimensão inválida: {dimensao} (use {', '.join(DIMENSIONS)})")
+        return _records(self.store.horas_por(group_by, self.filters()))
+
+
+class AlocacaoHandler(BaseHandler):
+    def payload(self):
+        if not self.store.alocacao_exists():
+            return []
+        todas = self.get_query_argument("todas", "0") == "1"
+        return _records(self.store.comparativo_alocacao(self.filters(), todas_alocacoes=todas))
+
+
+class LinhasHandler(BaseHandler):
+    def payload(self):
+        try:
+            page = int(self.get_query_argument("page", "0"))
+            page_size = int(self.get_query_argument("page_size", "100"))
+        except ValueError:
+            raise ValueError("page e page_size devem ser inteiros")
+        if page < 0 or not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"page >= 0 e 1 <= page_size <= {MAX_PAGE_SIZE}")
+        filters = self.filters()
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": self.store.count_table("horas", filters),
+            "linhas": _records(self.store.load_table_page("horas", filters, page, page_size)),
+        }
+
+
+def make_app(store, cache_bytes: int = 64 * 1024 * 1024) -> tornado.web.Application:
+    """Aplicação tornado sobre as funções de leitura de ``store`` (o módulo data_store).
+
+    O módulo é recebido como parâmetro para usar a mesma instância (conexão e
+    cache) do processo que sobe a API.
+    """
+    args = {"store": store, "cache": ResultCache(max_bytes=cache_bytes)}
+    return tornado.web.Application(
+        [
+            (r"/api/versao", VersaoHandler, args),
+            (r"/api/totais", TotaisHandler, args),
+            (r"/api/horas/([a-z,]+)", HorasPorHandler, args),
+            (r"/api/alocacao", AlocacaoHandler, args),
+            (r"/api/linhas", LinhasHandler, args),
+        ],
+        compress_response=True,
+    )
+
+
+def serve(store, port: int, address: str = "127.0.0.1") -> None:
+    """Sobe a API e bloqueia rodando o event loop atual."""
+    async def main():
+        HTTPServer(make_app(store), xheaders=True).listen(port, address)
+        logger.info("API de horas em http://%s:%s/api", address, port)
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def start_in_thread(store, port: int, address: str = "127.0.0.1") -> threading.Thread:
+    """Sobe a API numa thread própria, ao lado de outro servidor (ex.: o Streamlit)."""
+    thread = threading.Thread(target=serve, args=(store, port, address), name="horas-api", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,264 @@
+import json
+import os
+import queue
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import cache_planilhas
+import perf
+
+# Lista de planilhas/abas de horas; sem o arquivo, vale só a aba HORAS_V2 original
+FONTES_PATH = os.environ.get("HORAS_FONTES", "fontes_horas.json")
+FONTE_PADRAO = {
+    "nome": "HORAS_V2",
+    "sheet_id": "1ej9meDW8js9sPvqylB9eNbNLp3-phJlb7UE8j_BPvFk",
+    "worksheet": "HORAS_V2",
+}
+
+
+@dataclass(frozen=True)
+class Fonte:
+    """Uma aba de planilha de horas; ``nome`` vai na coluna ORIGEM de cada linha."""
+
+    nome: str
+    sheet_id: str
+    worksheet: str
+
+
+def carregar_fontes(path: str = FONTES_PATH) -> list[Fonte]:
+    """Lê as fontes do JSON (lista de ``{"nome", "sheet_id", "worksheet"}``)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            entradas = json.load(f)
+    except FileNotFoundError:
+        entradas = [FONTE_PADRAO]
+    fontes = [Fonte(**entrada) for entrada in entradas]
+    nomes = [f.nome for f in fontes]
+    if len(set(nomes)) != len(nomes):
+        raise ValueError(f"Nomes de fonte repetidos em {path}: {nomes}")
+    return fontes
+
+
+@dataclass
+class Plano:
+    """O que fazer com cada fonte numa atualização (por nome da fonte)."""
+
+    baixar: dict[str, int] = field(default_factory=dict)  # linha inicial do download
+    do_cache: list[str] = field(default_factory=list)  # inalteradas, relidas do cache em disco
+    em_dia: list[str] = field(default_factory=list)  # inalteradas e já no banco
+
+
+def planejar(
+    fontes: list[Fonte],
+    incremental: bool,
+    sincronizadas: dict[str, int],
+    modificadas: dict[str, str],
+    metas: dict[str, dict | None],
+) -> Plano:
+    """Decide por fonte: em dia, reler do cache ou baixar (e a partir de qual linha)."""
+    plano = Plano()
+    for fonte in fontes:
+        meta = metas.get(fonte.nome)
+        ultima = sincronizadas.get(fonte.nome)
+        consistente = meta is not None and ultima is not None and meta.get("ultima_linha") == ultima
+        modificada = modificadas.get(fonte.sheet_id)
+        inalterada = meta is not None and modificada is not None and meta.get("modified_time") == modificada
+        if inalterada and consistente:
+            plano.em_dia.append(fonte.nome)
+        elif inalterada:
+            plano.do_cache.append(fonte.nome)
+        elif incremental and consistente:
+            plano.baixar[fonte.nome] = ultima + 1
+        else:
+            plano.baixar[fonte.nome] = 2
+    return plano
+
+
+def alinhar(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Alinha os pedaços (de várias fontes) às colunas do primeiro."""
+    layout = None
+    for chunk in chunks:
+        if layout is None:
+            layout = list(chunk.columns)
+        elif list(chunk.columns) != layout:
+            # Abas com colunas em outra ordem (ou faltando) seguem o layout da primeira
+            chunk = chunk.reindex(columns=layout, fill_value="")
+        yield chunk
+
+
+def iter_fontes(
+    fontes: list[Fonte],
+    abrir: Callable[[Fonte], object],
+    start_rows: dict[str, int],
+    chunk_size: int,
+    origin_column: str,
+    max_workers: int = 4,
+    max_pendentes: int = 8,
+) -> Iterator[tuple[Fonte, pd.DataFrame]]:
+    """Lê as fontes em paralelo e entrega ``(fonte, pedaço)`` conforme chegam.
+
+    A falha de uma fonte interrompe as demais e é relançada aqui.
+    """
+    fila: queue.Queue = queue.Queue(maxsize=max_pendentes)
+    cancelado = threading.Event()
+    fim = object()
+
+    def enfileirar(item) -> bool:
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def ler(fonte: Fonte) -> None:
+        try:
+            client = abrir(fonte)
+            start_row = start_rows.get(fonte.nome, 2)
+            for chunk in client.iter_chunks(start_row=start_row, chunk_size=chunk_size):
+                chunk = chunk.assign(**{origin_column: fonte.nome})
+                if not enfileirar((fonte, chunk)):
+                    return
+            enfileirar((fonte, fim))
+        except Exception as e:
+            enfileirar((fonte, e))
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestao")
+    try:
+        for fonte in fontes:
+            pool.submit(ler, fonte)
+        pendentes = len(fontes)
+        while pendentes:
+            fonte, item = fila.get()
+            if item is fim:
+                pendentes -= 1
+                continue
+            if isinstance(item, Exception):
+                raise RuntimeError(f"Falha ao ler a fonte {fonte.nome}: {item}") from item
+            yield fonte, item
+    finally:
+        cancelado.set()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def atualizar(
+    fontes: list[Fonte],
+    store,
+    abrir: Callable[[Fonte], object],
+    tratar: Callable[[pd.DataFrame], pd.DataFrame],
+    modified_times: Callable[[Iterable[str]], dict[str, str]],
+    incremental: bool = False,
+    forcar: bool = False,
+    progress=None,
+    chunk_size: int = 5000,
+    max_workers: int = 4,
+) -> int:
+    """Baixa as fontes alteradas, trata e grava em ``horas`` (``store``); devolve as linhas baixadas."""
+    progress = progress or (lambda fraction, message="": None)
+    fontes = {f.nome: f for f in fontes}
+    sincronizadas = store.get_last_synced_rows()
+    cache_dir = store.planilhas_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    progress(0.02, "Verificando alterações nas planilhas...")
+    modificadas = {} if forcar else modified_times(f.sheet_id for f in fontes.values())
+    metas = {nome: cache_planilhas.ler_meta(cache_dir, nome) for nome in fontes}
+    plano = planejar(list(fontes.values()), incremental, sincronizadas, modificadas, metas)
+    # Origens no banco que saíram da lista de fontes só somem numa carga completa
+    removidas = set(sincronizadas) - set(fontes)
+    if not plano.baixar and not plano.do_cache and (incremental or not removidas):
+        progress(0.95, "Nenhuma planilha alterada desde a última importação.")
+        return 0
+
+    gravacoes: dict[str, cache_planilhas.Gravacao] = {}
+    lidas = 0
+    try:
+        for nome, inicio in plano.baixar.items():
+            gravacoes[nome] = cache_planilhas.Gravacao(cache_dir, nome, continuar=inicio > 2)
+        if gravacoes:
+            progress(0.05, f"Buscando dados de {len(gravacoes)} planilha(s) do Google Sheets...")
+            for fonte, chunk in iter_fontes(
+                [fontes[nome] for nome in gravacoes],
+                abrir,
+                plano.baixar,
+                chunk_size,
+                store.ORIGIN_COLUMN,
+                max_workers=max_workers,
+            ):
+                gravacoes[fonte.nome].gravar(chunk)
+                lidas += len(chunk)
+                # Sem total conhecido de antemão: avança assintoticamente até 60%
+                progress(0.6 - 0.55 * 0.5 ** (lidas / chunk_size), f"{lidas} linhas lidas ({fonte.nome})...")
+
+        carregar, full = _carregar(fontes, plano, gravacoes, metas, sincronizadas, incremental, removidas)
+
+        def chunks():
+            for nome in carregar:
+                if nome in gravacoes:
+                    yield from gravacoes[nome].iter_chunks()
+                else:
+                    yield from cache_planilhas.iter_cache(cache_dir, nome)
+
+        def tratadas():
+            for chunk in alinhar(chunks()):
+                with perf.span("ingestao.tratar", rows=len(chunk)):
+                    tratado = tratar(chunk)
+                yield tratado
+
+        # Posição de leitura de cada fonte, contando as linhas que o tratamento descarta
+        posicoes = {
+            nome: gravacoes[nome].ultima_linha if nome in gravacoes else metas[nome]["ultima_linha"]
+            for nome in carregar
+        }
+        if carregar:
+            progress(0.65, f"Gravando {len(carregar)} planilha(s) no banco...")
+            store.upsert_batches(tratadas(), full=full, lidas={n: p for n, p in posicoes.items() if p is not None})
+        for nome, gravacao in gravacoes.items():
+            # Leitura incremental não vê edições em linhas antigas: sem a data do Drive,
+            # a próxima carga completa relê a fonte
+            completa = plano.baixar[nome] == 2
+            gravacao.confirmar(modificadas.get(fontes[nome].sheet_id) if completa else None)
+    finally:
+        for gravacao in gravacoes.values():
+            gravacao.descartar()
+    progress(0.95, "Gravado no banco." if carregar else "Nenhuma alteração no conteúdo das planilhas.")
+    return lidas
+
+
+def _carregar(
+    fontes: dict[str, Fonte],
+    plano: Plano,
+    gravacoes: dict[str, cache_planilhas.Gravacao],
+    metas: dict[str, dict | None],
+    sincronizadas: dict[str, int],
+    incremental: bool,
+    removidas: set[str],
+) -> tuple[list[str], bool | set[str]]:
+    """Fontes a gravar no banco e o ``full`` do ``upsert_batches``."""
+    # Baixadas de novo mas com o mesmo conteúdo já gravado no banco (ex.: sem acesso ao Drive)
+    iguais = set()
+    for nome, gravacao in gravacoes.items():
+        meta = metas[nome]
+        if plano.baixar[nome] > 2:
+            igual = gravacao.partes == 0
+        else:
+            igual = (
+                meta is not None
+                and meta.get("ultima_linha") == sincronizadas.get(nome)
+                and cache_planilhas.content_hash(gravacao.meta(None)) == cache_planilhas.content_hash(meta)
+            )
+        if igual:
+            iguais.add(nome)
+
+    if incremental:
+        carregar = [n for n in [*gravacoes, *plano.do_cache] if n not in iguais]
+        return carregar, {n for n in carregar if plano.baixar.get(n, 2) == 2}
+    if set(gravacoes) <= iguais and not plano.do_cache and not removidas:
+        return [], True
+    # Carga completa apaga o que sumiu de qualquer planilha, então todas entram
+    return list(fontes), True
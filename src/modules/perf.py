@@ -0,0 +1,229 @@
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+# Consultas SQL são logadas neste logger (nível DEBUG) com duração e linhas
+sql_logger = logging.getLogger(f"{__name__}.sql")
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float = 0.0
+    run: int | None = None
+    parent: int | None = None
+    depth: int = 0
+    thread: str = ""
+    attrs: dict = field(default_factory=dict)
+    id: int = 0
+
+
+class Tracer:
+    """Registra spans de tempo em memória (últimos ``max_spans``), por thread.
+
+    Spans abertos dentro de outro viram filhos dele; ``run()`` agrupa os spans
+    de um rerun do Streamlit ou de um job do worker sob um mesmo id.
+    """
+
+    def __init__(self, max_spans: int = 5000):
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._runs = itertools.count(1)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> list[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        s = Span(
+            name=name,
+            start=time.perf_counter(),
+            run=getattr(self._local, "run", None),
+            parent=parent.id if parent else None,
+            depth=parent.depth + 1 if parent else 0,
+            thread=threading.current_thread().name,
+            attrs=attrs,
+            id=next(self._ids),
+        )
+        stack.append(s)
+        try:
+            yield s
+        finally:
+            s.duration = time.perf_counter() - s.start
+            stack.pop()
+            with self._lock:
+                self._spans.append(s)
+
+    def context(self) -> tuple[int | None, Span | None]:
+        """Execução e span abertos na thread atual, para continuar em outra (``attach``)."""
+        stack = self._stack()
+        return getattr(self._local, "run", None), stack[-1] if stack else None
+
+    @contextmanager
+    def attach(self, context: tuple[int | None, Span | None]):
+        """Spans desta thread viram filhos do ``context`` capturado em outra thread."""
+        run, parent = context
+        previous_run, previous_stack = getattr(self._local, "run", None), self._stack()
+        self._local.run = run
+        self._local.stack = [parent] if parent is not None else []
+        try:
+            yield
+        finally:
+            self._local.run = previous_run
+            self._local.stack = previous_stack
+
+    @contextmanager
+    def run(self, name: str):
+        """Abre um span raiz com id de execução novo; devolve o id."""
+        previous = getattr(self._local, "run", None)
+        run_id = self._local.run = next(self._runs)
+        try:
+            with self.span(name):
+                yield run_id
+        finally:
+            self._local.run = previous
+
+    def spans(self, run: int | None = None) -> list[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        if run is not None:
+            spans = [s for s in spans if s.run == run]
+        return sorted(spans, key=lambda s: s.start)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def to_json(self, run: int | None = None) -> str:
+        spans = [
+            {**asdict(s), "start": s.start - self._origin} for s in self.spans(run)
+        ]
+        return json.dumps({"spans": spans}, ensure_ascii=False, default=str)
+
+    def to_chrome_trace(self, run: int | None = None) -> str:
+        """Formato Trace Event (abrir em chrome://tracing ou ui.perfetto.dev)."""
+        spans = self.spans(run)
+        pid = os.getpid()
+        tids = {name: i for i, name in enumerate(dict.fromkeys(s.thread for s in spans), 1)}
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for name, tid in tids.items()
+        ]
+        events += [
+            {
+                "name": s.name,
+                "cat": s.name.split(".")[0],
+                "ph": "X",
+                "ts": (s.start - self._origin) * 1e6,
+                "dur": s.duration * 1e6,
+                "pid": pid,
+                "tid": tids[s.thread],
+                "args": {k: str(v) for k, v in s.attrs.items()},
+            }
+            for s in spans
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, ensure_ascii=False)
+
+
+def breakdown(spans: list[Span]) -> list[dict]:
+    """Tempo total e próprio (sem os filhos) por nome de span, do maior para o menor."""
+    children: dict[int, float] = {}
+    for s in spans:
+        if s.parent is not None:
+            children[s.parent] = children.get(s.parent, 0.0) + s.duration
+    stages: dict[str, dict] = {}
+    for s in spans:
+        stage = stages.setdefault(s.name, {"etapa": s.name, "chamadas": 0, "total_ms": 0.0, "proprio_ms": 0.0})
+        stage["chamadas"] += 1
+        stage["total_ms"] += s.duration * 1000
+        stage["proprio_ms"] += (s.duration - children.get(s.id, 0.0)) * 1000
+    return sorted(stages.values(), key=lambda r: r["proprio_ms"], reverse=True)
+
+
+tracer = Tracer()
+span = tracer.span
+
+
+def timed(name: str | None = None):
+    """Decorator que envolve a função em um span (nome padrão: ``modulo.funcao``)."""
+    def decorator(func):
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _rows(result) -> int | None:
+    if hasattr(result, "num_rows"):
+        return result.num_rows
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return 1
+    if result is None:
+        return 0
+    return len(result)
+
+
+class TracedCursor:
+    """Cursor DuckDB que registra cada consulta (duração e linhas) como span ``sql``.
+
+    O tempo do ``execute`` e o da leitura do resultado (``fetch*``) são
+    somados no mesmo span; os demais métodos passam direto ao cursor.
+    """
+
+    _FETCH = ("fetchone", "fetchall", "fetchmany", "fetchdf", "df", "fetch_df", "fetch_arrow_table", "arrow")
+
+    def __init__(self, cursor):
+        # O replacement scan (``SELECT * FROM df``) procura a variável no frame
+        # que chama ``execute``, que aqui é este wrapper; liberamos os frames acima
+        cursor.execute("SET python_scan_all_frames = true")
+        self._cursor = cursor
+        self._last: Span | None = None
+
+    def execute(self, query: str, parameters=None):
+        with tracer.span("sql", query=" ".join(query.split())) as s:
+            if parameters is None:
+                self._cursor.execute(query)
+            else:
+                self._cursor.execute(query, parameters)
+        self._last = s
+        sql_logger.debug("%.1f ms: %s", s.duration * 1000, s.attrs["query"])
+        return self
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if name not in self._FETCH or self._last is None:
+            return attr
+
+        @functools.wraps(attr)
+        def fetch(*args, **kwargs):
+            inicio = time.perf_counter()
+            result = attr(*args, **kwargs)
+            s = self._last
+            elapsed = time.perf_counter() - inicio
+            s.duration += elapsed
+            s.attrs["rows"] = _rows(result)
+            sql_logger.debug("%.1f ms, %s linhas: %s", s.duration * 1000, s.attrs["rows"], s.attrs["query"])
+            return result
+        return fetch
@@ -0,0 +1,54 @@
+import pandas as pd
+
+# Rótulo das categorias agregadas além do limite de barras/séries
+OUTROS = "Outros"
+
+
+def _agrupar_resto(df: pd.DataFrame, col: str, value_cols: list[str], n: int) -> pd.Series:
+    """``col`` com as categorias fora das ``n - 1`` de maior total trocadas por ``Outros``."""
+    totais = df.groupby(col, observed=True)[value_cols].sum().sum(axis=1)
+    if len(totais) <= n:
+        return df[col]
+    manter = totais.sort_values(ascending=False, kind="stable").index[: n - 1]
+    return df[col].astype(object).where(df[col].isin(manter), OUTROS)
+
+
+def ordem(df: pd.DataFrame, col: str, value_col: str | list[str]) -> list:
+    """Categorias de ``col`` do maior para o menor total, com ``Outros`` por último."""
+    value_cols = [value_col] if isinstance(value_col, str) else list(value_col)
+    totais = df.groupby(col, observed=True, sort=False)[value_cols].sum().sum(axis=1)
+    rotulos = totais.sort_values(ascending=False, kind="stable").index.tolist()
+    return [r for r in rotulos if r != OUTROS] + ([OUTROS] if OUTROS in rotulos else [])
+
+
+def top_n(df: pd.DataFrame, label_col: str, value_col: str | list[str], n: int) -> pd.DataFrame:
+    """Uma linha por ``label_col``: as ``n - 1`` maiores e a soma das demais em ``Outros``.
+
+    Só as colunas usadas no gráfico são mantidas e linhas zeradas são
+    descartadas, então o dado embutido no spec tem no máximo ``n`` linhas.
+    Vem do maior para o menor (``Outros`` por último); com várias colunas de
+    valor, a ordem é pela soma delas.
+    """
+    value_cols = [value_col] if isinstance(value_col, str) else list(value_col)
+    df = df.loc[df[value_cols].ne(0).any(axis=1), [label_col, *value_cols]]
+    df = df.assign(**{label_col: _agrupar_resto(df, label_col, value_cols, n)})
+    df = df.groupby(label_col, observed=True, sort=False)[value_cols].sum()
+    return df.loc[ordem(df.reset_index(), label_col, value_cols)].reset_index()
+
+
+def empilhado(
+    df: pd.DataFrame, index_col: str, series_col: str, value_col: str, max_index: int, max_series: int
+) -> pd.DataFrame:
+    """Formato longo (índice × série) para barras empilhadas, já limitado.
+
+    Parte do resultado agregado (uma linha por par), sem pivotar: células
+    zeradas saem antes de tudo, séries além das ``max_series`` de maior total
+    e índices além dos ``max_index`` viram ``Outros``, e os pares repetidos
+    são somados. O total de linhas fica limitado a ``max_index * max_series``.
+    """
+    df = df.loc[df[value_col] != 0, [index_col, series_col, value_col]]
+    df = df.assign(**{
+        series_col: _agrupar_resto(df, series_col, [value_col], max_series),
+        index_col: _agrupar_resto(df, index_col, [value_col], max_index),
+    })
+    return df.groupby([index_col, series_col], observed=True, sort=False, as_index=False)[value_col].sum()
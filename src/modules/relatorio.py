@@ -0,0 +1,98 @@
+import functools
+import os
+from collections.abc import Iterator
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "..", "templates")
+TEMPLATE_NAME = "relatorio.html.j2"
+# O relatorio.html é o layout de referência; dele só aproveitamos o CSS
+CSS_SOURCE = "relatorio.html"
+
+
+@functools.lru_cache(maxsize=1)
+def _template():
+    """Carrega e compila o template (e o CSS) uma única vez por processo."""
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(["html", "j2"]),
+    )
+    with open(os.path.join(TEMPLATE_DIR, CSS_SOURCE), encoding="utf-8") as f:
+        css = f.read().split("<style>")[1].split("</style>")[0]
+    env.globals["css"] = Markup(css)
+    return env.get_template(TEMPLATE_NAME)
+
+
+def formatar_br(values) -> pd.Series:
+    """Formata números no padrão brasileiro (1.234,5) de forma vetorizada."""
+    values = pd.Series(values, dtype="float64")
+    decimos = (values.abs() * 10).round().astype("int64")
+    inteiro = (decimos // 10).astype(str).str.replace(r"\B(?=(\d{3})+$)", ".", regex=True)
+    sinal = np.where(values.round(1) < 0, "-", "")
+    return sinal + inteiro + "," + (decimos % 10).astype(str)
+
+
+def _fmt(value: float) -> str:
+    return formatar_br([value]).iloc[0]
+
+
+def _distribuicao(titulo: str, horas: pd.Series) -> dict:
+    """Linhas de uma tabela de distribuição (nome, horas, % do maior)."""
+    maximo = horas.max() if len(horas) > 0 else 0
+    pct = (horas / maximo * 100) if maximo > 0 else horas * 0
+    linhas = pd.DataFrame({
+        "NOME": horas.index,
+        "HORAS": formatar_br(horas.to_numpy()),
+        "PCT": pct.round().astype("int64").to_numpy(),
+    })
+    return {"titulo": titulo, "linhas": linhas.to_dict("records"), "total": _fmt(horas.sum())}
+
+
+_STATUS_CLS = {"Excedido": "status-over", "Atenção": "status-warn", "No prazo": "status-ok"}
+
+
+def _alocacao(comparativo: pd.DataFrame) -> list[dict]:
+    linhas = pd.DataFrame({
+        "PROFISSIONAL": comparativo["PROFISSIONAL"].to_numpy(),
+        "CLIENTE": comparativo["CLIENTE"].to_numpy(),
+        "HORAS_ALOCADAS": formatar_br(comparativo["HORAS_ALOCADAS"].to_numpy()),
+        "HORAS_GASTAS": formatar_br(comparativo["HORAS_GASTAS"].to_numpy()),
+        "HORAS_RESTANTES": formatar_br(comparativo["HORAS_RESTANTES"].to_numpy()),
+        "STATUS_CLS": comparativo["STATUS"].map(_STATUS_CLS).to_numpy(),
+        "STATUS": comparativo["STATUS"].to_numpy(),
+    })
+    return linhas.to_dict("records")
+
+
+def render(
+    periodos: list[str],
+    kpis: dict,
+    horas_profissional: pd.Series,
+    horas_cliente: pd.Series,
+    comparativo: pd.DataFrame | None = None,
+) -> Iterator[str]:
+    """Renderiza o relatório em pedaços (``Template.generate``).
+
+    ``horas_profissional``/``horas_cliente`` são séries indexadas pelo nome,
+    já ordenadas; ``comparativo`` vem de ``data_store.comparativo_alocacao``.
+    """
+    context = {
+        "periodo": f"{periodos[0]} – {periodos[-1]}" if periodos else "–",
+        "hoje": datetime.now().strftime("%d/%m/%Y"),
+        "total_registros": kpis["registros"],
+        "horas_totais": _fmt(kpis["horas"]),
+        "n_profissionais": kpis["profissionais"],
+        "distribuicoes": [
+            _distribuicao("Profissional", horas_profissional),
+            _distribuicao("Cliente", horas_cliente),
+        ],
+        "alocacao": None,
+    }
+    if comparativo is not None:
+        context["alocacao"] = _alocacao(comparativo)
+        context["total_restantes"] = _fmt(comparativo["HORAS_RESTANTES"].sum())
+    return _template().generate(**context)
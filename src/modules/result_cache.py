@@ -0,0 +1,86 @@
+import sys
+import threading
+
+import pandas as pd
+from cachetools import LRUCache, TTLCache
+
+
+def _sizeof(value) -> int:
+    """Tamanho aproximado em bytes, usado para a evicção por tamanho."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum()) or 1
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def freeze(value):
+    """Converte argumentos (dicts, listas) em chaves hasheáveis."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        # O tipo entra na chave: lista (valores) e tupla (intervalo) filtram diferente
+        return type(value).__name__, tuple(freeze(v) for v in value)
+    return value
+
+
+class ResultCache:
+    """Cache LRU limitado por bytes, compartilhado entre threads/sessões.
+
+    Com ``ttl`` (segundos), as entradas também expiram após esse tempo.
+    DataFrames são copiados na saída para que quem chama possa alterá-los
+    sem corromper o valor guardado.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: float | None = None):
+        if ttl is None:
+            self._cache = LRUCache(maxsize=max_bytes, getsizeof=_sizeof)
+        else:
+            self._cache = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=_sizeof)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                return _copy(value)
+            except KeyError:
+                self.misses += 1
+        value = compute()
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                # Valor maior que o cache inteiro: não guarda
+                pass
+        return _copy(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self.ttl is not None:
+                self._cache.expire()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._cache),
+                "bytes": self._cache.currsize,
+                "max_bytes": self._cache.maxsize,
+            }
+
+
+def _copy(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: list(v) if isinstance(v, list) else _copy(v) for k, v in value.items()}
+    return value
@@ -0,0 +1,82 @@
+import json
+import os
+from datetime import datetime
+
+import duckdb
+
+MANIFEST = "manifest.json"
+
+
+def _manifest_path(base_dir: str) -> str:
+    return os.path.join(base_dir, MANIFEST)
+
+
+def list_snapshots(base_dir: str) -> list[dict]:
+    """Versões gravadas, da mais antiga para a mais nova."""
+    try:
+        with open(_manifest_path(base_dir), encoding="utf-8") as f:
+            return json.load(f)["snapshots"]
+    except FileNotFoundError:
+        return []
+
+
+def _write_manifest(base_dir: str, snapshots: list[dict]) -> None:
+    # Grava em arquivo temporário e troca, para nunca deixar o manifesto pela metade
+    tmp = _manifest_path(base_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"snapshots": snapshots}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _manifest_path(base_dir))
+
+
+def write_snapshot(con: duckdb.DuckDBPyConnection, base_dir: str, table_name: str = "horas") -> dict:
+    """Exporta ``table_name`` para um diretório Parquet imutável, particionado por PERIODO."""
+    os.makedirs(base_dir, exist_ok=True)
+    snapshots = list_snapshots(base_dir)
+    version = snapshots[-1]["version"] + 1 if snapshots else 1
+    path = f"v{version:06d}"
+    rows = con.execute(f"SELECT count(*) FROM {table_name}").fetchone()[0]
+    con.execute(
+        f"COPY {table_name} TO '{os.path.join(base_dir, path)}' "
+        f"(FORMAT PARQUET, PARTITION_BY (PERIODO), COMPRESSION ZSTD)"
+    )
+    entry = {
+        "version": version,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "rows": rows,
+        "path": path,
+    }
+    _write_manifest(base_dir, snapshots + [entry])
+    return entry
+
+
+def snapshot_source(base_dir: str, version: int) -> str:
+    """Expressão ``read_parquet`` da versão, para usar no FROM sem carregar os dados."""
+    for entry in list_snapshots(base_dir):
+        if entry["version"] == version:
+            glob = os.path.join(base_dir, entry["path"], "**", "*.parquet")
+            return f"read_parquet('{glob}', hive_partitioning = true)"
+    raise ValueError(f"Snapshot inexistente: {version}")
+
+
+def diff_query(base_dir: str, old: int, new: int, row_keys: list[str], compare: list[str]) -> str:
+    """Linhas incluídas, alteradas (valores novos) ou removidas entre duas versões.
+
+    As linhas são casadas por ``row_keys`` e dadas como alteradas se alguma
+    coluna de ``compare`` mudar.
+    """
+    if not row_keys:
+        raise ValueError(f"As versões {old} e {new} não têm colunas de chave em comum")
+    antigo, novo = snapshot_source(base_dir, old), snapshot_source(base_dir, new)
+    keys = ", ".join(row_keys)
+    on = " AND ".join(f"antigo.{k} = novo.{k}" for k in row_keys)
+    changed = " OR ".join(f"antigo.{c} IS DISTINCT FROM novo.{c}" for c in compare) or "false"
+    return f"""
+        SELECT CASE WHEN antigo.{row_keys[-1]} IS NULL THEN 'incluída' ELSE 'alterada' END AS ALTERACAO, novo.*
+        FROM {novo} AS novo LEFT JOIN {antigo} AS antigo ON {on}
+        WHERE antigo.{row_keys[-1]} IS NULL OR {changed}
+        UNION ALL BY NAME
+        SELECT 'removida' AS ALTERACAO, antigo.*
+        FROM {antigo} AS antigo
+        WHERE ({keys}) NOT IN (SELECT ({keys}) FROM {novo})
+        ORDER BY {keys}
+    """
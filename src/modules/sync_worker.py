@@ -0,0 +1,117 @@
+import itertools
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluído"
+ERRO = "erro"
+
+
+@dataclass
+class Job:
+    id: int
+    name: str
+    func: Callable
+    kwargs: dict
+    state: str = PENDENTE
+    progress: float = 0.0
+    message: str = ""
+    result: object = None
+    error: str | None = None
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in (PENDENTE, EXECUTANDO)
+
+
+class SyncWorker:
+    """Executa jobs de sincronização em uma thread de fundo, um por vez.
+
+    ``func`` recebe ``progress(fração, mensagem)`` além dos ``kwargs`` do job.
+    Um job com o mesmo nome de outro ainda pendente/em execução não é
+    enfileirado de novo; o job existente é devolvido.
+    """
+
+    def __init__(self, max_history: int = 20):
+        self.max_history = max_history
+        self.interval = 0
+        self._queue: queue.Queue[Job] = queue.Queue()
+        self._jobs: OrderedDict[int, Job] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._schedule_stop: threading.Event | None = None
+        self._thread = threading.Thread(target=self._run, name="sync-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, name: str, func: Callable, **kwargs) -> Job:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.name == name and job.active:
+                    return job
+            job = Job(id=next(self._ids), name=name, func=func, kwargs=kwargs)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.active:
+                    break
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+        return job
+
+    def latest(self, name: str | None = None) -> Job | None:
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if name is None or job.name == name:
+                    return job
+        return None
+
+    def schedule(self, name: str, func: Callable, interval_seconds: int, **kwargs) -> None:
+        """Enfileira ``func`` a cada ``interval_seconds``; 0 desliga o agendamento."""
+        with self._lock:
+            if self._schedule_stop is not None:
+                self._schedule_stop.set()
+                self._schedule_stop = None
+            self.interval = interval_seconds
+            if interval_seconds <= 0:
+                return
+            stop = threading.Event()
+            self._schedule_stop = stop
+
+        def tick():
+            while not stop.wait(interval_seconds):
+                self.submit(name, func, **kwargs)
+
+        threading.Thread(target=tick, name=f"sync-schedule-{name}", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+
+            def progress(fraction: float, message: str = "", job=job) -> None:
+                job.progress = min(max(fraction, 0.0), 1.0)
+                job.message = message
+
+            job.state = EXECUTANDO
+            job.started_at = datetime.now()
+            try:
+                job.result = job.func(progress=progress, **job.kwargs)
+                job.progress = 1.0
+                job.state = CONCLUIDO
+            except Exception as e:
+                logger.exception("Falha no job %s", job.name)
+                job.error = str(e)
+                job.state = ERRO
+            finally:
+                job.finished_at = datetime.now()
+                self._queue.task_done()
@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import perf
+
+
+class WriteQueue:
+    """Serializa as escritas no banco em uma única thread, com fila limitada.
+
+    Leitores continuam nos cursores da conexão compartilhada e nunca esperam
+    pela fila; cada escrita é enfileirada e quem chama bloqueia até ela
+    terminar (ou a fila ter vaga, se estiver cheia com ``maxsize`` pendentes).
+    Uma escrita chamada de dentro de outra roda direto, sem reentrar na fila.
+    ``stats()`` informa o tempo de espera na fila e o de execução.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self._queue: queue.Queue[tuple] = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._escritas = 0
+        self._erros = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._ultima_espera = 0.0
+        self._execucao_total = 0.0
+        self._thread = threading.Thread(target=self._run, name="duckdb-writer", daemon=True)
+        self._thread.start()
+
+    def run(self, name: str, func: Callable):
+        """Executa ``func()`` na thread de escrita e devolve o resultado (ou relança o erro)."""
+        if threading.current_thread() is self._thread:
+            return func()
+        future: Future = Future()
+        self._queue.put((name, func, future, time.perf_counter(), perf.tracer.context()))
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            name, func, future, enfileirada, context = self._queue.get()
+            inicio = time.perf_counter()
+            espera = inicio - enfileirada
+            erro = False
+            try:
+                with perf.tracer.attach(context), perf.span("duckdb.escrita", operacao=name) as s:
+                    s.attrs["espera_ms"] = round(espera * 1000, 1)
+                    future.set_result(func())
+            except BaseException as e:
+                # Quem chamou relança e trata o erro; a thread segue atendendo a fila
+                erro = True
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._escritas += 1
+                    self._erros += erro
+                    self._espera_total += espera
+                    self._espera_max = max(self._espera_max, espera)
+                    self._ultima_espera = espera
+                    self._execucao_total += time.perf_counter() - inicio
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        with self._lock:
+            escritas = self._escritas
+            return {
+                "pendentes": self._queue.qsize(),
+                "max_pendentes": self.maxsize,
+                "escritas": escritas,
+                "erros": self._erros,
+                "espera_media_ms": self._espera_total / escritas * 1000 if escritas else 0.0,
+                "espera_max_ms": self._espera_max * 1000,
+                "ultima_espera_ms": self._ultima_espera * 1000,
+                "execucao_media_ms": self._execucao_total / escritas * 1000 if escritas else 0.0,
+            }
@@ -0,0 +1,35 @@
+"""API JSON somente leitura com os agregados de horas.
+
+Uso (a partir da raiz do projeto):
+
+    python src/servir_api.py --port 8502
+    curl -H 'Accept-Encoding: gzip' 'http://localhost:8502/api/horas/cliente?periodo=01/2026'
+
+Abre o DuckDB em modo leitura, então pode rodar em vários processos ao mesmo
+tempo, mas não enquanto o app estiver com o banco aberto para escrita; nesse
+caso use a API embutida no app (variável ``HORAS_API_PORT``).
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "modules"))
+
+from modules import data_store, http_api  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--db", default=data_store.DB_PATH, help="arquivo DuckDB (padrão: o do app)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    data_store.use_database(args.db, read_only=True)
+    http_api.serve(data_store, args.port, args.address)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import sys
 import os
+import shutil
+import tempfile
 from datetime import datetime
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "modules"))
@@ -7,53 +9,184 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "modules"))
 import streamlit as st
 import pandas as pd
 import altair as alt
-from modules.gs_integrations import GSGoldenBagres
+# Import plano (como no data_store) para compartilhar o mesmo tracer
+import perf
+from modules import alocacao_drive, data_store, http_api, ingestao, reducao, relatorio
+from modules.gs_integrations import GSGoldenBagres, drive_client, modified_times
+from modules.result_cache import ResultCache
+from modules.sync_worker import ERRO, SyncWorker
 from modules.data_store import (
-    table_exists, save_dataframe, load_dataframe, get_last_update,
-    alocacao_exists, save_alocacao, load_alocacao,
-    list_tables, load_table,
+    table_exists, get_last_update,
+    alocacao_exists, save_alocacao_csv, preview_alocacao_csv, load_alocacao,
+    comparativo_alocacao, alocacao_versoes,
+    list_tables,
+    filter_options, horas_kpis, horas_por, count_filtered, load_filtered_page,
+    cache_stats, write_stats, get_data_version,
+    table_columns, column_stats, count_table, load_table_page,
+    list_snapshots, load_snapshot, diff_snapshots,
+    get_connection, dados_relatorio,
 )
 
-SHEET_ID = "1ej9meDW8js9sPvqylB9eNbNLp3-phJlb7UE8j_BPvFk"
-WORKSHEET = "HORAS_V2"
-
-
-def fetch_and_store() -> pd.DataFrame:
-    """Busca dados do Google Sheets, trata e salva no DuckDB."""
-    client = GSGoldenBagres(sheet_id=SHEET_ID, worksheet=WORKSHEET, show_=False)
-    df = client.start()
+CHUNK_SIZE = 5000
+# Planilhas lidas ao mesmo tempo (cada uma em uma thread)
+MAX_FONTES_CONCORRENTES = 4
+# Limites dos gráficos: o excedente é somado em "Outros" e o spec Vega-Lite não cresce com os dados
+MAX_BARRAS = 20
+MAX_SERIES = 10
+MAX_BARRAS_ALOCACAO = 30
+# Linhas por página na consulta a uma versão do histórico
+HISTORICO_PAGE_SIZE = 100
+# Memo do painel por combinação de filtros: até 64 MB, cada entrada vale por 15 minutos
+PAINEL_CACHE_BYTES = 64 * 1024 * 1024
+PAINEL_CACHE_TTL = 15 * 60
+
+
+def tratar_horas(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipa as colunas vindas da planilha e descarta linhas sem período válido."""
+    mes = pd.to_numeric(df["MES"].astype(str).str.strip(), errors="coerce")
+    ano = pd.to_numeric(df["ANO"].astype(str).str.strip(), errors="coerce")
+    valid = mes.between(1, 12) & ano.between(1000, 9999)
+    df = df[valid].copy()
+    mes, ano = mes[valid].astype("int16"), ano[valid].astype("int16")
 
     df["HORAS_EM_MINUTOS"] = (
         df["HORAS_EM_MINUTOS"]
         .astype(str)
         .str.replace(",", ".", regex=False)
     )
-    df["HORAS_EM_MINUTOS"] = pd.to_numeric(df["HORAS_EM_MINUTOS"], errors="coerce").fillna(0).round(1)
-    df["MINUTO"] = pd.to_numeric(df["MINUTO"], errors="coerce").fillna(0).round(1)
-    df["MES"] = df["MES"].astype(str).str.strip()
-    df["ANO"] = df["ANO"].astype(str).str.strip()
-    df["MES_ANO"] = df["MES"].str.zfill(2) + "/" + df["ANO"]
-
-    save_dataframe(df)
+    # float64 fixo: pedaços só com valores inteiros não podem mudar o schema do upsert em pedaços
+    df["HORAS_EM_MINUTOS"] = pd.to_numeric(df["HORAS_EM_MINUTOS"], errors="coerce").fillna(0).round(1).astype("float64")
+    df["MINUTO"] = pd.to_numeric(df["MINUTO"], errors="coerce").fillna(0).round(1).astype("float64")
+    df["MES"] = mes
+    df["ANO"] = ano
+    df["MES_ANO"] = mes.astype(str).str.zfill(2) + "/" + ano.astype(str)
+    df["PERIODO"] = ano.astype("int32") * 100 + mes
     return df
 
 
-def load_data() -> pd.DataFrame | None:
-    """Lê dados do DuckDB. Retorna None se a tabela não existir."""
-    if not table_exists():
+@perf.timed()
+def fetch_and_store(incremental: bool = False, progress=None, forcar: bool = False) -> int:
+    """Baixa as planilhas de horas configuradas, trata e grava no DuckDB (ver ``ingestao.atualizar``).
+
+    Retorna o número de linhas baixadas das planilhas.
+    """
+    return ingestao.atualizar(
+        ingestao.carregar_fontes(),
+        data_store,
+        lambda f: GSGoldenBagres(sheet_id=f.sheet_id, worksheet=f.worksheet, show_=False),
+        tratar_horas,
+        modified_times,
+        incremental=incremental,
+        forcar=forcar,
+        progress=progress,
+        chunk_size=CHUNK_SIZE,
+        max_workers=MAX_FONTES_CONCORRENTES,
+    )
+
+
+def sincronizar_horas(incremental: bool = False, progress=None) -> int:
+    """Job do worker de sincronização; devolve o número de registros carregados."""
+    with perf.tracer.run("sync"):
+        return fetch_and_store(incremental=incremental, progress=progress)
+
+
+def sincronizar_alocacoes(progress=None) -> dict:
+    """Job do worker: importa os CSVs de alocação novos ou alterados da pasta do Drive."""
+    with perf.tracer.run("alocacao"):
+        return alocacao_drive.sincronizar_pasta(
+            alocacao_drive.PASTA_ID,
+            drive_client,
+            data_store,
+            max_workers=MAX_FONTES_CONCORRENTES,
+            progress=progress,
+        )
+
+
+@st.cache_resource
+def get_sync_worker() -> SyncWorker:
+    """Worker de sincronização único por processo, compartilhado entre sessões."""
+    return SyncWorker()
+
+
+@st.cache_resource
+def start_api() -> int | None:
+    """Sobe a API JSON na porta ``HORAS_API_PORT``, se definida, uma vez por processo.
+
+    Roda no mesmo processo do app para compartilhar a conexão e o cache do
+    data_store, sem disputar o lock do arquivo DuckDB.
+    """
+    port = os.environ.get("HORAS_API_PORT")
+    if not port:
         return None
-    return load_dataframe()
+    http_api.start_in_thread(data_store, int(port), os.environ.get("HORAS_API_ADDRESS", "127.0.0.1"))
+    return int(port)
+
+
+@st.cache_resource
+def get_painel_cache() -> ResultCache:
+    """Memo dos KPIs e dados dos gráficos do painel, compartilhado entre sessões."""
+    return ResultCache(max_bytes=PAINEL_CACHE_BYTES, ttl=PAINEL_CACHE_TTL)
+
+
+def chave_filtros(filters: dict[str, list | None]) -> tuple:
+    """Seleção em forma canônica: a ordem dos itens marcados não muda a chave."""
+    return tuple(
+        (col, None if valores is None else tuple(sorted(set(valores), key=lambda v: (v is None, str(v)))))
+        for col, valores in sorted(filters.items())
+    )
+
+
+def _calcular_painel(filters: dict[str, list | None]) -> dict:
+    dados = {
+        "kpis": horas_kpis(filters),
+        "profissional": reducao.top_n(horas_por("PROFISSIONAL", filters), "PROFISSIONAL", "HORAS_EM_MINUTOS", MAX_BARRAS),
+        "cliente": reducao.top_n(
+            horas_por("CLIENTE_CONCATENADO", filters), "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS", MAX_BARRAS
+        ),
+        "periodo": horas_por("MES_ANO", filters),
+        "area": reducao.top_n(horas_por("AREA", filters), "AREA", "HORAS_EM_MINUTOS", MAX_BARRAS),
+        "profissional_cliente": reducao.empilhado(
+            horas_por(["PROFISSIONAL", "CLIENTE_CONCATENADO"], filters),
+            "PROFISSIONAL", "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS", MAX_BARRAS, MAX_SERIES,
+        ),
+        "comparativo": None,
+    }
+    if alocacao_exists():
+        comparativo = comparativo_alocacao(filters)
+        comparativo["HORAS_RESTANTES"] = comparativo["HORAS_RESTANTES"].clip(lower=0)
+        dados["comparativo"] = comparativo
+    return dados
+
+
+def dados_painel(filters: dict[str, list | None]) -> dict:
+    """KPIs e dados (já reduzidos) dos gráficos do painel para a seleção ``filters``.
+
+    Memoizado por seleção canônica e versão dos dados: ir e voltar nos
+    filtros, ou abrir a mesma visão em outra sessão, não refaz as consultas.
+    """
+    cache = get_painel_cache()
+    with perf.span("painel.dados") as s:
+        key = (chave_filtros(filters), get_data_version())
+        hits = cache.hits
+        dados = cache.get_or_compute(key, lambda: _calcular_painel(filters))
+        s.attrs["cache"] = "hit" if cache.hits > hits else "miss"
+        return dados
 
 
-def bar_chart_with_labels(data, x_col, y_col, horizontal=False):
-    """Cria gráfico de barras Altair com valores visíveis nas barras."""
-    data = data.copy()
+@perf.timed()
+def bar_chart_with_labels(data, x_col, y_col, horizontal=False, max_barras=MAX_BARRAS):
+    """Cria gráfico de barras Altair com valores visíveis nas barras.
+
+    Mostra no máximo ``max_barras`` barras; as menores são somadas em "Outros".
+    """
+    data = reducao.top_n(data, x_col, y_col, max_barras)
     data[y_col] = data[y_col].round(1)
+    sort = reducao.ordem(data, x_col, y_col)
 
     if horizontal:
         bars = alt.Chart(data).mark_bar().encode(
             x=alt.X(f"{y_col}:Q", title="Horas"),
-            y=alt.Y(f"{x_col}:N", sort="-x", title=None),
+            y=alt.Y(f"{x_col}:N", sort=sort, title=None),
         )
         text = bars.mark_text(
             align="right", fontSize=14, fontWeight="bold", color="white"
@@ -62,7 +195,7 @@ def bar_chart_with_labels(data, x_col, y_col, horizontal=False):
         )
     else:
         bars = alt.Chart(data).mark_bar().encode(
-            x=alt.X(f"{x_col}:N", sort="-y", title=None),
+            x=alt.X(f"{x_col}:N", sort=sort, title=None),
             y=alt.Y(f"{y_col}:Q", title="Horas"),
         )
         text = bars.mark_text(
@@ -74,53 +207,109 @@ def bar_chart_with_labels(data, x_col, y_col, horizontal=False):
     return (bars + text).properties(height=350)
 
 
-def stacked_bar_chart(data, index_col, columns_col, value_col):
-    """Cria gráfico de barras empilhadas com valores visíveis."""
-    melted = data.reset_index().melt(id_vars=index_col, var_name=columns_col, value_name=value_col)
-    melted = melted[melted[value_col] > 0]
-    melted[value_col] = melted[value_col].round(1)
+@perf.timed()
+def stacked_bar_chart(data, index_col, columns_col, value_col, max_barras=MAX_BARRAS, max_series=MAX_SERIES):
+    """Cria gráfico de barras empilhadas com valores visíveis.
+
+    ``data`` vem no formato longo (uma linha por ``index_col`` × ``columns_col``);
+    barras e séries além dos limites são somadas em "Outros".
+    """
+    data = reducao.empilhado(data, index_col, columns_col, value_col, max_barras, max_series)
+    data[value_col] = data[value_col].round(1)
+    series = reducao.ordem(data, columns_col, value_col)
+    # Mesma ordem de empilhamento nas barras e nos rótulos (a da legenda)
+    data["ORDEM"] = data[columns_col].map({s: i for i, s in enumerate(series)})
 
-    bars = alt.Chart(melted).mark_bar().encode(
-        x=alt.X(f"{index_col}:N", title=None),
+    bars = alt.Chart(data).mark_bar().encode(
+        x=alt.X(f"{index_col}:N", sort=reducao.ordem(data, index_col, value_col), title=None),
         y=alt.Y(f"{value_col}:Q", title="Horas", stack="zero"),
-        color=alt.Color(f"{columns_col}:N", title="Cliente"),
+        color=alt.Color(f"{columns_col}:N", sort=series, title="Cliente"),
+        order=alt.Order("ORDEM:Q"),
     )
-    text = alt.Chart(melted).mark_text(
-        fontSize=13, fontWeight="bold", color="white"
+    text = bars.mark_text(
+        fontSize=13, fontWeight="bold"
     ).encode(
-        x=alt.X(f"{index_col}:N"),
-        y=alt.Y(f"{value_col}:Q", stack="zero"),
         text=alt.Text(f"{value_col}:Q", format=".1f"),
+        color=alt.value("white"),
+        detail=f"{columns_col}:N",
     )
 
     return (bars + text).properties(height=400)
 
 
-def render_painel(df: pd.DataFrame):
+@perf.timed()
+def alocacao_chart(comparativo, max_barras=MAX_BARRAS_ALOCACAO):
+    """Barras de horas gastas e restantes por profissional / cliente.
+
+    Mostra até ``max_barras`` pares (os de mais horas); a altura acompanha o
+    número de barras, então também fica limitada.
+    """
+    data = comparativo.assign(
+        LABEL=comparativo["PROFISSIONAL"] + " / " + comparativo["CLIENTE"],
+        HORAS_RESTANTES=comparativo["HORAS_RESTANTES"].clip(lower=0),
+    )
+    data = reducao.top_n(data, "LABEL", ["HORAS_GASTAS", "HORAS_RESTANTES"], max_barras)
+    sort = reducao.ordem(data, "LABEL", ["HORAS_GASTAS", "HORAS_RESTANTES"])
+    # Só agora, com no máximo max_barras linhas, vai para o formato longo
+    chart_data = data.melt(id_vars="LABEL", var_name="STATUS", value_name="HORAS")
+    chart_data = chart_data[chart_data["HORAS"] > 0]
+    chart_data["HORAS"] = chart_data["HORAS"].round(1)
+    chart_data["STATUS"] = chart_data["STATUS"].replace({
+        "HORAS_GASTAS": "Gastas",
+        "HORAS_RESTANTES": "Restantes",
+    })
+
+    color_scale = alt.Scale(
+        domain=["Gastas", "Restantes"],
+        range=["#4c78a8", "#e45756"],
+    )
+
+    bars = alt.Chart(chart_data).mark_bar().encode(
+        x=alt.X("HORAS:Q", title="Horas", stack="zero"),
+        y=alt.Y("LABEL:N", sort=sort, title=None),
+        color=alt.Color("STATUS:N", scale=color_scale, title="Status"),
+    )
+    text = bars.mark_text(
+        align="center", fontSize=13, fontWeight="bold"
+    ).encode(
+        text=alt.Text("HORAS:Q", format=".1f"),
+        color=alt.value("white"),
+        detail="STATUS:N",
+    )
+
+    return (bars + text).properties(height=max(350, len(sort) * 35))
+
+
+@perf.timed()
+def render_painel():
     """Renderiza a aba do painel com filtros e gráficos."""
     # --- Filtros na sidebar ---
     st.sidebar.header("Filtros")
 
-    profissionais = sorted(df["PROFISSIONAL"].dropna().unique())
-    clientes = sorted(df["CLIENTE_CONCATENADO"].dropna().unique())
-    periodos = sorted(df["MES_ANO"].dropna().unique(), key=lambda x: (x.split("/")[1], x.split("/")[0]))
+    options = filter_options()
+    profissionais = options["PROFISSIONAL"]
+    clientes = options["CLIENTE_CONCATENADO"]
+    periodos = options["MES_ANO"]
 
     sel_profissional = st.sidebar.multiselect("Profissional", profissionais, default=profissionais)
     sel_cliente = st.sidebar.multiselect("Cliente", clientes, default=clientes)
     sel_periodo = st.sidebar.multiselect("Período (Mês/Ano)", periodos, default=periodos)
 
-    mask = (
-        df["PROFISSIONAL"].isin(sel_profissional)
-        & df["CLIENTE_CONCATENADO"].isin(sel_cliente)
-        & df["MES_ANO"].isin(sel_periodo)
-    )
-    filtered = df[mask]
+    # Filtros e agregações rodam no DuckDB; só os resultados agregados vêm para o pandas
+    filters = {
+        "PROFISSIONAL": sel_profissional,
+        "CLIENTE_CONCATENADO": sel_cliente,
+        "MES_ANO": sel_periodo,
+    }
+
+    dados = dados_painel(filters)
 
     # --- KPIs ---
+    kpis = dados["kpis"]
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total de registros", len(filtered))
-    col2.metric("Horas totais", f"{filtered['HORAS_EM_MINUTOS'].sum():.3f}h")
-    col3.metric("Profissionais", filtered["PROFISSIONAL"].nunique())
+    col1.metric("Total de registros", kpis["registros"])
+    col2.metric("Horas totais", f"{kpis['horas']:.3f}h")
+    col3.metric("Profissionais", kpis["profissionais"])
 
     st.divider()
 
@@ -129,35 +318,18 @@ def render_painel(df: pd.DataFrame):
 
     with col_left:
         st.subheader("Horas por Profissional")
-        hours_by_prof = (
-            filtered.groupby("PROFISSIONAL")["HORAS_EM_MINUTOS"]
-            .sum()
-            .reset_index()
-        )
-        st.altair_chart(bar_chart_with_labels(hours_by_prof, "PROFISSIONAL", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
+        st.altair_chart(bar_chart_with_labels(dados["profissional"], "PROFISSIONAL", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
 
     with col_right:
         st.subheader("Horas por Cliente")
-        hours_by_client = (
-            filtered.groupby("CLIENTE_CONCATENADO")["HORAS_EM_MINUTOS"]
-            .sum()
-            .reset_index()
-        )
-        st.altair_chart(bar_chart_with_labels(hours_by_client, "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
+        st.altair_chart(bar_chart_with_labels(dados["cliente"], "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
 
     col_left2, col_right2 = st.columns(2)
 
     with col_left2:
         st.subheader("Horas por Período")
-        hours_by_period = (
-            filtered.groupby("MES_ANO")["HORAS_EM_MINUTOS"]
-            .sum()
-            .reset_index()
-        )
-        hours_by_period["_sort"] = hours_by_period["MES_ANO"].apply(
-            lambda x: (x.split("/")[1], x.split("/")[0])
-        )
-        hours_by_period = hours_by_period.sort_values("_sort").drop(columns="_sort")
+        # Já vem ordenado por ano/mês do DuckDB
+        hours_by_period = dados["periodo"]
         sort_order = hours_by_period["MES_ANO"].tolist()
 
         bars = alt.Chart(hours_by_period).mark_bar().encode(
@@ -173,91 +345,21 @@ def render_painel(df: pd.DataFrame):
 
     with col_right2:
         st.subheader("Horas por Área")
-        hours_by_area = (
-            filtered.groupby("AREA")["HORAS_EM_MINUTOS"]
-            .sum()
-            .reset_index()
-        )
-        st.altair_chart(bar_chart_with_labels(hours_by_area, "AREA", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
+        st.altair_chart(bar_chart_with_labels(dados["area"], "AREA", "HORAS_EM_MINUTOS", horizontal=True), width="stretch")
 
     st.subheader("Horas por Profissional × Cliente")
-    pivot = (
-        filtered.groupby(["PROFISSIONAL", "CLIENTE_CONCATENADO"])["HORAS_EM_MINUTOS"]
-        .sum()
-        .reset_index()
-        .pivot_table(index="PROFISSIONAL", columns="CLIENTE_CONCATENADO", values="HORAS_EM_MINUTOS", fill_value=0)
+    st.altair_chart(
+        stacked_bar_chart(dados["profissional_cliente"], "PROFISSIONAL", "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS"),
+        width="stretch",
     )
-    st.altair_chart(stacked_bar_chart(pivot, "PROFISSIONAL", "CLIENTE_CONCATENADO", "HORAS_EM_MINUTOS"), width="stretch")
 
     # --- Alocação vs Realizado ---
-    if alocacao_exists():
+    # Junção alocação x horas feita no DuckDB pela chave (profissional, cliente)
+    comparativo = dados["comparativo"]
+    if comparativo is not None:
         st.subheader("Alocação vs Realizado")
 
-        df_aloc = load_alocacao()
-        df_aloc["HORAS_ALOCADAS"] = (df_aloc["MES_ATUAL"] / 100) * df_aloc["HORAS_MES"]
-
-        # Criar chave concatenada para o join (mesma lógica do CLIENTE_CONCATENADO)
-        df_aloc["CONCAT_KEY"] = df_aloc["PROFISSIONAL"] + df_aloc["CLIENTE"]
-
-        # Filtrar alocação pelos mesmos filtros da sidebar
-        aloc_mask = (
-            df_aloc["PROFISSIONAL"].isin(sel_profissional)
-            & df_aloc["CLIENTE"].isin(sel_cliente)
-        )
-        df_aloc = df_aloc[aloc_mask]
-
-        # Horas gastas reais agrupadas por profissional + cliente
-        horas_gastas = filtered.copy()
-        horas_gastas["CONCAT_KEY"] = horas_gastas["PROFISSIONAL"] + horas_gastas["CLIENTE_CONCATENADO"]
-        horas_gastas = (
-            horas_gastas.groupby("CONCAT_KEY")["HORAS_EM_MINUTOS"]
-            .sum()
-            .reset_index()
-            .rename(columns={"HORAS_EM_MINUTOS": "HORAS_GASTAS"})
-        )
-
-        # Juntar alocação com realizado pela chave concatenada
-        comparativo = df_aloc.merge(
-            horas_gastas,
-            on="CONCAT_KEY",
-            how="left",
-        )
-        comparativo["HORAS_GASTAS"] = comparativo["HORAS_GASTAS"].fillna(0).round(1)
-        comparativo["HORAS_RESTANTES"] = (comparativo["HORAS_ALOCADAS"] - comparativo["HORAS_GASTAS"]).round(1)
-        comparativo["HORAS_RESTANTES"] = comparativo["HORAS_RESTANTES"].clip(lower=0)
-        comparativo["LABEL"] = comparativo["PROFISSIONAL"] + " / " + comparativo["CLIENTE"]
-
-        # Preparar dados para gráfico empilhado
-        chart_data = comparativo[["LABEL", "HORAS_GASTAS", "HORAS_RESTANTES"]].melt(
-            id_vars="LABEL", var_name="STATUS", value_name="HORAS"
-        )
-        chart_data["HORAS"] = chart_data["HORAS"].round(1)
-        chart_data["STATUS"] = chart_data["STATUS"].replace({
-            "HORAS_GASTAS": "Gastas",
-            "HORAS_RESTANTES": "Restantes",
-        })
-
-        color_scale = alt.Scale(
-            domain=["Gastas", "Restantes"],
-            range=["#4c78a8", "#e45756"],
-        )
-
-        bars = alt.Chart(chart_data).mark_bar().encode(
-            x=alt.X("HORAS:Q", title="Horas", stack="zero"),
-            y=alt.Y("LABEL:N", sort="-x", title=None),
-            color=alt.Color("STATUS:N", scale=color_scale, title="Status"),
-        )
-        text = alt.Chart(chart_data).mark_text(
-            align="center", fontSize=13, fontWeight="bold", color="white"
-        ).encode(
-            x=alt.X("HORAS:Q", stack="zero"),
-            y=alt.Y("LABEL:N", sort="-x"),
-            text=alt.Text("HORAS:Q", format=".1f"),
-            opacity=alt.condition(alt.datum.HORAS > 0, alt.value(1), alt.value(0)),
-        )
-
-        chart_height = max(350, len(comparativo) * 35)
-        st.altair_chart((bars + text).properties(height=chart_height), width="stretch")
+        st.altair_chart(alocacao_chart(comparativo), width="stretch")
 
         st.dataframe(
             comparativo[["PROFISSIONAL", "CLIENTE", "MES_ATUAL", "HORAS_MES", "HORAS_ALOCADAS", "HORAS_GASTAS", "HORAS_RESTANTES"]],
@@ -265,9 +367,70 @@ def render_painel(df: pd.DataFrame):
         )
 
     st.subheader("Dados filtrados")
-    st.dataframe(filtered, width="stretch")
+    # Só a página exibida sai do DuckDB; o total vem de um COUNT com os mesmos filtros
+    total = count_filtered(filters)
+    page_size = st.selectbox("Registros por página", [50, 100, 500, 1000], index=1, key="painel_page_size")
+    n_pages = max(1, -(-total // page_size))
+    page = st.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1, key="painel_page")
+    st.caption(f"Exibindo página **{page}** de **{n_pages}** | **{total}** registros filtrados")
+    st.dataframe(load_filtered_page(filters, page - 1, page_size), width="stretch")
+
+
+@st.fragment(run_every=1)
+def _sync_progress(name: str = "horas"):
+    """Acompanha o job em execução sem bloquear a sessão; recarrega o app ao terminar."""
+    job = get_sync_worker().latest(name)
+    if job is None or not job.active:
+        st.rerun()
+    st.progress(job.progress, text=job.message or "Aguardando na fila...")
+
+
+def render_sync_status(name: str = "horas", resumo=lambda result: f"{result} registros carregados."):
+    """Mostra o estado do último job de sincronização ``name``."""
+    job = get_sync_worker().latest(name)
+    if job is None:
+        return
+    if job.active:
+        _sync_progress(name)
+    elif job.state == ERRO:
+        st.error(f"Falha na atualização ({job.finished_at:%H:%M:%S}): {job.error}")
+    else:
+        st.success(f"Dados atualizados com sucesso às {job.finished_at:%H:%M:%S}. {resumo(job.result)}")
 
 
+def render_historico():
+    """Lista os snapshots das importações e compara duas versões."""
+    versoes = list_snapshots()
+    if not versoes:
+        return
+    with st.expander(f"Histórico de importações ({len(versoes)} versões)"):
+        st.dataframe(pd.DataFrame(versoes).iloc[::-1], width="stretch", hide_index=True)
+        numeros = [v["version"] for v in versoes]
+
+        # Dados como estavam numa versão, paginados direto do Parquet
+        col_v, col_p = st.columns(2)
+        versao = col_v.selectbox("Consultar versão", numeros, index=len(numeros) - 1, key="historico_versao")
+        linhas = next(v["rows"] for v in versoes if v["version"] == versao)
+        n_pages = max(1, -(-linhas // HISTORICO_PAGE_SIZE))
+        page = col_p.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1, key="historico_page")
+        st.caption(f"Exibindo página **{page}** de **{n_pages}** | **{linhas}** registros na v{versao}")
+        st.dataframe(load_snapshot(versao, page=page - 1, page_size=HISTORICO_PAGE_SIZE), width="stretch")
+
+        if len(versoes) < 2:
+            return
+        col_a, col_b = st.columns(2)
+        antiga = col_a.selectbox("Versão anterior", numeros, index=len(numeros) - 2)
+        nova = col_b.selectbox("Versão posterior", numeros, index=len(numeros) - 1)
+        try:
+            diff = diff_snapshots(antiga, nova)
+        except ValueError as e:
+            st.warning(f"Não foi possível comparar as versões: {e}")
+            return
+        st.caption(f"**{len(diff)}** linhas incluídas, alteradas ou removidas entre v{antiga} e v{nova}.")
+        st.dataframe(diff, width="stretch", hide_index=True)
+
+
+@perf.timed()
 def render_atualizacao():
     """Renderiza a aba de atualização de dados."""
     # --- Seção: Horas (Google Sheets) ---
@@ -280,11 +443,44 @@ def render_atualizacao():
     else:
         st.warning("Nenhum dado encontrado. Faça a primeira carga abaixo.")
 
+    incremental = st.toggle(
+        "Sincronização incremental (apenas linhas novas)",
+        value=has_data,
+        help="Desligado, as planilhas alteradas desde a última leitura completa são baixadas inteiras e comparadas com o banco.",
+    )
+    worker = get_sync_worker()
     if st.button("Atualizar dados do Google Sheets", type="primary"):
-        with st.spinner("Buscando dados do Google Sheets..."):
-            df = fetch_and_store()
-        st.success(f"Dados atualizados com sucesso. {len(df)} registros carregados.")
-        st.rerun()
+        worker.submit("horas", sincronizar_horas, incremental=incremental)
+    render_sync_status()
+
+    intervalo = st.number_input(
+        "Atualização automática incremental (minutos, 0 = desligada)",
+        min_value=0,
+        value=worker.interval // 60,
+        step=5,
+    )
+    if intervalo * 60 != worker.interval:
+        worker.schedule("horas", sincronizar_horas, intervalo * 60, incremental=True)
+
+    stats = cache_stats()
+    st.caption(
+        f"Cache de consultas: {stats['hits']} acertos, {stats['misses']} faltas, "
+        f"{stats['entries']} entradas ({stats['bytes'] / 1024 / 1024:.1f} MB)"
+    )
+    stats = get_painel_cache().stats()
+    st.caption(
+        f"Cache do painel: {stats['hits']} acertos, {stats['misses']} faltas, "
+        f"{stats['entries']} combinações de filtros ({stats['bytes'] / 1024 / 1024:.1f} de "
+        f"{stats['max_bytes'] / 1024 / 1024:.0f} MB)"
+    )
+    stats = write_stats()
+    st.caption(
+        f"Fila de escrita: {stats['escritas']} escritas, {stats['pendentes']} pendentes "
+        f"(máx. {stats['max_pendentes']}); espera média {stats['espera_media_ms']:.0f} ms, "
+        f"máxima {stats['espera_max_ms']:.0f} ms"
+    )
+
+    render_historico()
 
     st.divider()
 
@@ -298,190 +494,59 @@ def render_atualizacao():
     else:
         st.warning("Nenhuma alocação carregada.")
 
+    if alocacao_drive.PASTA_ID:
+        if st.button("Importar alocações da pasta do Drive"):
+            worker.submit("alocacao", sincronizar_alocacoes)
+        render_sync_status(
+            "alocacao",
+            lambda r: f"{len(r['carregados'])} período(s) carregado(s), {len(r['ignorados'])} arquivo(s) ignorado(s).",
+        )
+        versoes = alocacao_versoes()
+        if versoes:
+            with st.expander(f"Versões por período ({len(versoes)})"):
+                st.dataframe(
+                    pd.DataFrame([{"PERIODO": p, **v} for p, v in sorted(versoes.items())]),
+                    width="stretch",
+                    hide_index=True,
+                )
+
     uploaded = st.file_uploader("Enviar CSV de alocação", type=["csv"])
     if uploaded is not None:
         try:
-            df_csv = pd.read_csv(uploaded, sep=None, engine="python")
+            path = _spool_upload(uploaded)
             st.write("Preview dos dados:")
-            st.dataframe(df_csv.head(10), width="stretch")
+            st.dataframe(preview_alocacao_csv(path), width="stretch")
             if st.button("Confirmar upload de alocação", type="primary"):
-                # Converter colunas numéricas
-                for col in ["MES_ANTERIOR", "MES_ATUAL", "PROXIMO_MES", "HORAS_TOTAIS", "HORAS_MES"]:
-                    if col in df_csv.columns:
-                        df_csv[col] = pd.to_numeric(df_csv[col], errors="coerce").fillna(0)
-                save_alocacao(df_csv)
-                st.success(f"Alocação atualizada com sucesso. {len(df_csv)} registros carregados.")
+                total = save_alocacao_csv(path)
+                os.remove(path)
+                st.success(f"Alocação atualizada com sucesso. {total} registros carregados.")
                 st.rerun()
         except Exception as e:
             st.error(f"Erro ao ler CSV: {e}")
 
 
-def _fmt(value: float) -> str:
-    """Formata número no padrão brasileiro: 1.234,5"""
-    inteiro = int(value)
-    decimal = f"{value:.1f}".split(".")[1]
-    parte_inteira = f"{inteiro:,}".replace(",", ".")
-    return f"{parte_inteira},{decimal}"
-
-
-def _bar_row(label: str, horas: float, max_horas: float) -> str:
-    pct = (horas / max_horas * 100) if max_horas > 0 else 0
-    return (
-        f"<tr>"
-        f'<td>{label}</td>'
-        f'<td class="text-right">{_fmt(horas)}</td>'
-        f'<td><div class="bar-cell">'
-        f'<div class="bar-track"><div class="bar-fill" style="width:{pct:.0f}%"></div></div>'
-        f'<span class="bar-value">{pct:.0f}%</span>'
-        f'</div></td></tr>'
-    )
-
-
-def gerar_relatorio_html(df: pd.DataFrame) -> str:
-    """Gera HTML do relatório com dados reais."""
-    hoje = datetime.now().strftime("%d/%m/%Y")
-    periodos = sorted(df["MES_ANO"].dropna().unique(), key=lambda x: (x.split("/")[1], x.split("/")[0]))
-    periodo_str = f"{periodos[0]} – {periodos[-1]}" if periodos else "–"
+def _spool_upload(uploaded) -> str:
+    """Copia o arquivo enviado para disco (uma vez por upload) para o DuckDB ler direto."""
+    path = os.path.join(tempfile.gettempdir(), f"alocacao-upload-{uploaded.file_id}.csv")
+    if not os.path.exists(path):
+        uploaded.seek(0)
+        with open(path + ".tmp", "wb") as f:
+            shutil.copyfileobj(uploaded, f, length=1024 * 1024)
+        os.replace(path + ".tmp", path)
+    return path
 
-    total_registros = len(df)
-    horas_totais = df["HORAS_EM_MINUTOS"].sum()
-    n_profissionais = df["PROFISSIONAL"].nunique()
 
-    # Horas por profissional
-    h_prof = df.groupby("PROFISSIONAL")["HORAS_EM_MINUTOS"].sum().sort_values(ascending=False)
-    max_prof = h_prof.max() if len(h_prof) > 0 else 1
-    rows_prof = "".join(_bar_row(nome, horas, max_prof) for nome, horas in h_prof.items())
-    total_prof = h_prof.sum()
-
-    # Horas por cliente
-    h_cli = df.groupby("CLIENTE_CONCATENADO")["HORAS_EM_MINUTOS"].sum().sort_values(ascending=False)
-    max_cli = h_cli.max() if len(h_cli) > 0 else 1
-    rows_cli = "".join(_bar_row(nome, horas, max_cli) for nome, horas in h_cli.items())
-    total_cli = h_cli.sum()
-
-    # Alocação vs Realizado
-    secao_alocacao = ""
-    kpi_restantes = ""
-    if alocacao_exists():
-        df_aloc = load_alocacao()
-        df_aloc["HORAS_ALOCADAS"] = (df_aloc["MES_ATUAL"] / 100) * df_aloc["HORAS_MES"]
-        df_aloc["CONCAT_KEY"] = df_aloc["PROFISSIONAL"] + df_aloc["CLIENTE"]
-
-        horas_gastas = df.copy()
-        horas_gastas["CONCAT_KEY"] = horas_gastas["PROFISSIONAL"] + horas_gastas["CLIENTE_CONCATENADO"]
-        horas_gastas = (
-            horas_gastas.groupby("CONCAT_KEY")["HORAS_EM_MINUTOS"]
-            .sum().reset_index().rename(columns={"HORAS_EM_MINUTOS": "HORAS_GASTAS"})
-        )
-        comp = df_aloc.merge(horas_gastas, on="CONCAT_KEY", how="left")
-        comp["HORAS_GASTAS"] = comp["HORAS_GASTAS"].fillna(0).round(1)
-        comp["HORAS_RESTANTES"] = (comp["HORAS_ALOCADAS"] - comp["HORAS_GASTAS"]).round(1)
-
-        total_restantes = comp["HORAS_RESTANTES"].sum()
-        kpi_restantes = f'''
-    <div class="kpi accent-danger">
-      <div class="label">Horas Restantes (Alocação)</div>
-      <div class="value">{_fmt(total_restantes)}h</div>
-    </div>'''
-
-        rows_aloc = ""
-        for _, r in comp.iterrows():
-            pct_usado = (r["HORAS_GASTAS"] / r["HORAS_ALOCADAS"] * 100) if r["HORAS_ALOCADAS"] > 0 else 0
-            if pct_usado > 100:
-                status_cls, status_txt = "status-over", "Excedido"
-            elif pct_usado >= 90:
-                status_cls, status_txt = "status-warn", "Atenção"
-            else:
-                status_cls, status_txt = "status-ok", "No prazo"
-            rows_aloc += (
-                f'<tr><td>{r["PROFISSIONAL"]}</td><td>{r["CLIENTE"]}</td>'
-                f'<td class="text-right">{_fmt(r["HORAS_ALOCADAS"])}</td>'
-                f'<td class="text-right">{_fmt(r["HORAS_GASTAS"])}</td>'
-                f'<td class="text-right">{_fmt(r["HORAS_RESTANTES"])}</td>'
-                f'<td class="{status_cls}">{status_txt}</td></tr>'
-            )
-        secao_alocacao = f'''
-  <section>
-    <h2>Alocação vs Realizado</h2>
-    <table>
-      <thead><tr><th>Profissional</th><th>Cliente</th><th>Alocadas</th><th>Gastas</th><th>Restantes</th><th>Status</th></tr></thead>
-      <tbody>{rows_aloc}</tbody>
-    </table>
-  </section>'''
-
-    TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
-    with open(os.path.join(TEMPLATE_DIR, "relatorio.html"), encoding="utf-8") as f:
-        css = f.read().split("<style>")[1].split("</style>")[0]
-
-    return f'''<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>Relatório – Controle de Horas</title>
-  <style>{css}</style>
-</head>
-<body>
-<div class="page">
-  <header>
-    <div>
-      <h1>Controle de Horas</h1>
-      <span style="color: var(--text-muted); font-size: 0.9rem;">Relatório de acompanhamento</span>
-    </div>
-    <div class="meta">
-      <div>Período: <strong>{periodo_str}</strong></div>
-      <div>Gerado em: <strong>{hoje}</strong></div>
-    </div>
-  </header>
-
-  <div class="kpis">
-    <div class="kpi">
-      <div class="label">Total de Registros</div>
-      <div class="value">{total_registros:,}</div>
-    </div>
-    <div class="kpi">
-      <div class="label">Horas Totais</div>
-      <div class="value">{_fmt(horas_totais)}h</div>
-    </div>
-    <div class="kpi">
-      <div class="label">Profissionais</div>
-      <div class="value">{n_profissionais}</div>
-    </div>
-    {kpi_restantes}
-  </div>
-
-  <section>
-    <h2>Horas por Profissional</h2>
-    <table>
-      <thead><tr><th>Profissional</th><th>Horas</th><th style="width:40%">Distribuição</th></tr></thead>
-      <tbody>{rows_prof}</tbody>
-      <tfoot><tr><td>Total</td><td class="text-right">{_fmt(total_prof)}</td><td></td></tr></tfoot>
-    </table>
-  </section>
-
-  <section>
-    <h2>Horas por Cliente</h2>
-    <table>
-      <thead><tr><th>Cliente</th><th>Horas</th><th style="width:40%">Distribuição</th></tr></thead>
-      <tbody>{rows_cli}</tbody>
-      <tfoot><tr><td>Total</td><td class="text-right">{_fmt(total_cli)}</td><td></td></tr></tfoot>
-    </table>
-  </section>
-
-  {secao_alocacao}
-
-  <footer>
-    Controle de Horas &middot; Relatório gerado automaticamente &middot; Golden Bagres ©
-  </footer>
-</div>
-</body>
-</html>'''
+@perf.timed()
+def gerar_relatorio_html(filters: dict[str, list]) -> str:
+    """Gera HTML do relatório com dados reais (agregados lidos do rollup)."""
+    with get_connection() as con:
+        return "".join(relatorio.render(**dados_relatorio(con, filters)))
 
 
+@perf.timed()
 def render_relatorio():
     """Renderiza a aba de geração de relatório HTML."""
-    df = load_data()
-    if df is None:
+    if not table_exists():
         st.warning("Nenhum dado disponível. Carregue os dados primeiro na aba **Atualização de Dados**.")
         return
 
@@ -490,10 +555,7 @@ def render_relatorio():
     # --- Filtros ---
     col_f1, col_f2 = st.columns(2)
     with col_f1:
-        periodos = sorted(
-            df["MES_ANO"].dropna().unique(),
-            key=lambda x: (x.split("/")[1], x.split("/")[0]),
-        )
+        periodos = filter_options()["MES_ANO"]
         sel_periodo = st.multiselect(
             "Período (Mês/Ano)",
             periodos,
@@ -501,18 +563,18 @@ def render_relatorio():
             key="relatorio_periodo",
         )
     with col_f2:
-        profissionais = sorted(df["PROFISSIONAL"].dropna().unique())
+        profissionais = filter_options()["PROFISSIONAL"]
         sel_profissional = st.multiselect(
             "Profissional",
             profissionais,
             default=profissionais,
             key="relatorio_profissional",
         )
-    filtered = df[df["MES_ANO"].isin(sel_periodo) & df["PROFISSIONAL"].isin(sel_profissional)]
-    st.caption(f"**{len(filtered)}** registros com os filtros selecionados.")
+    filters = {"MES_ANO": sel_periodo, "PROFISSIONAL": sel_profissional}
+    st.caption(f"**{horas_kpis(filters)['registros']}** registros com os filtros selecionados.")
 
     if st.button("Gerar relatório", type="primary"):
-        html = gerar_relatorio_html(filtered)
+        html = gerar_relatorio_html(filters)
         st.session_state["relatorio_html"] = html
 
     if "relatorio_html" in st.session_state:
@@ -528,6 +590,7 @@ def render_relatorio():
         st.components.v1.html(html, height=800, scrolling=True)
 
 
+@perf.timed()
 def render_explorador():
     """Renderiza a aba do explorador de dados do DuckDB."""
     tables = list_tables()
@@ -539,30 +602,35 @@ def render_explorador():
     selected_table = st.selectbox("Selecione uma tabela", tables)
 
     if selected_table:
-        df = load_table(selected_table)
+        columns = table_columns(selected_table)
 
-        st.caption(f"**{len(df)}** registros | **{len(df.columns)}** colunas")
+        st.caption(f"**{count_table(selected_table)}** registros | **{len(columns)}** colunas")
 
-        # --- Filtros por coluna ---
+        # --- Filtros por coluna (viram predicados SQL) ---
+        filters = {}
         with st.expander("Filtros", expanded=False):
-            filters = {}
             filter_cols = st.multiselect(
                 "Colunas para filtrar",
-                df.columns.tolist(),
+                list(columns),
             )
             for col in filter_cols:
-                if df[col].dtype in ("object", "string"):
-                    unique_vals = sorted(df[col].dropna().unique().tolist())
+                stats = column_stats(selected_table, col)
+                if not stats["numeric"]:
+                    if stats["truncated"]:
+                        text = st.text_input(f"{col} (contém)", key=f"filter_{col}")
+                        if text:
+                            filters[col] = text
+                        continue
                     selected = st.multiselect(
                         f"{col}",
-                        unique_vals,
-                        default=unique_vals,
+                        stats["values"],
+                        default=stats["values"],
                         key=f"filter_{col}",
                     )
                     filters[col] = selected
-                else:
-                    col_min = float(df[col].min())
-                    col_max = float(df[col].max())
+                elif stats["min"] is not None:
+                    col_min = float(stats["min"])
+                    col_max = float(stats["max"])
                     if col_min == col_max:
                         st.text(f"{col}: valor único = {col_min}")
                     else:
@@ -575,37 +643,81 @@ def render_explorador():
                         )
                         filters[col] = (vmin, vmax)
 
-            # Aplicar filtros
-            mask = pd.Series(True, index=df.index)
-            for col, val in filters.items():
-                if isinstance(val, list):
-                    mask &= df[col].isin(val)
-                else:
-                    vmin, vmax = val
-                    mask &= df[col].between(vmin, vmax)
-            df = df[mask]
+        total = count_table(selected_table, filters)
+        page_size = st.selectbox("Registros por página", [50, 100, 500, 1000], index=1)
+        n_pages = max(1, -(-total // page_size))
+        page = st.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1)
 
-        st.caption(f"Exibindo **{len(df)}** registros após filtros")
-        st.dataframe(df, use_container_width=True)
+        st.caption(f"Exibindo página **{page}** de **{n_pages}** | **{total}** registros após filtros")
+        st.dataframe(load_table_page(selected_table, filters, page - 1, page_size), width="stretch")
+
+
+def render_desempenho(run_id: int):
+    """Tempos por etapa dos reruns desta sessão, com exportação JSON/Chrome trace."""
+    runs = st.session_state.get("perf_runs", [])
+    selected = st.selectbox(
+        "Rerun",
+        list(reversed(runs)),
+        format_func=lambda r: f"#{r} (atual)" if r == run_id else f"#{r}",
+    )
+    spans = perf.tracer.spans(selected)
+    if not spans:
+        st.info("Sem medições para este rerun (o histórico guarda só os spans mais recentes).")
+        return
+
+    st.caption("Tempo próprio = tempo da etapa sem as etapas internas; o rerun atual ainda não inclui esta aba.")
+    st.dataframe(pd.DataFrame(perf.breakdown(spans)).round(1), width="stretch")
+
+    queries = [
+        {"ms": round(s.duration * 1000, 1), "linhas": s.attrs.get("rows"), "sql": s.attrs["query"]}
+        for s in spans if s.name == "sql"
+    ]
+    st.subheader(f"Consultas SQL ({len(queries)})")
+    st.dataframe(pd.DataFrame(queries, columns=["ms", "linhas", "sql"]), width="stretch")
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button(
+        "Exportar rerun (JSON)", perf.tracer.to_json(selected),
+        file_name=f"desempenho_rerun_{selected}.json", mime="application/json",
+    )
+    col2.download_button(
+        "Exportar rerun (Chrome trace)", perf.tracer.to_chrome_trace(selected),
+        file_name=f"trace_rerun_{selected}.json", mime="application/json",
+    )
+    # Inclui os jobs de sincronização, que rodam na thread do worker
+    col3.download_button(
+        "Exportar tudo (Chrome trace)", perf.tracer.to_chrome_trace(),
+        file_name="trace_completo.json", mime="application/json",
+    )
 
 
 def main():
     st.set_page_config(page_title="Controle de Horas", layout="wide")
+    start_api()
+    with perf.tracer.run("rerun") as run_id:
+        runs = st.session_state.setdefault("perf_runs", [])
+        runs.append(run_id)
+        del runs[:-20]
+        _render_app(run_id)
+
+
+def _render_app(run_id: int):
     st.title("Controle de Horas")
+    show_perf = st.sidebar.toggle("Desempenho", help="Mostra a aba de tempos por etapa e consultas SQL")
 
-    tab_painel, tab_atualizar, tab_explorador, tab_relatorio = st.tabs(
-        ["Painel", "Atualização de Dados", "Explorador de Dados", "Relatório"]
-    )
+    tab_names = ["Painel", "Atualização de Dados", "Explorador de Dados", "Relatório"]
+    if show_perf:
+        tab_names.append("Desempenho")
+    tab_painel, tab_atualizar, tab_explorador, tab_relatorio, *tab_perf = st.tabs(tab_names)
 
     with tab_atualizar:
         render_atualizacao()
 
     with tab_painel:
-        df = load_data()
-        if df is None:
+        if not table_exists():
             st.warning("Nenhum dado disponível. Vá na aba **Atualização de Dados** para carregar.")
         else:
-            render_painel(df)
+            render_painel()
 
     with tab_explorador:
         render_explorador()
@@ -613,6 +725,11 @@ def main():
     with tab_relatorio:
         render_relatorio()
 
+    # Por último, para já enxergar as etapas deste rerun
+    if tab_perf:
+        with tab_perf[0]:
+            render_desempenho(run_id)
+
 
 if __name__ == "__main__":
     main()